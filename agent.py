@@ -1,12 +1,75 @@
+import time
 import numpy as np
-import pandas as pd
+from transposition import TranspositionTable
+from evaluation import PatternEvaluator
+from legality import LegalityMask
+from threat_search import ThreatSpaceSearch
+from move_ordering import MoveOrdering
+from search_stats import SearchStats
+from opening_book import OpeningBook
+
+# Scores of numeric mode
+WIN_SCORE = 10**9
+INFINITY = WIN_SCORE + 1
+
+class SearchTimeout(Exception):
+    '''Raised inside the search when the deadline has passed, or the node budget is used up'''
+    pass
 
 class Iterative_Deepening_Alpha_Beta():
-    def __init__(self, env, player_index = None):
+    '''
+    mode: value used by the search
+        'priority': perceives only 'win', 'lose', 'tie', 'unknown'
+        'numeric': scores positions at max_depth with evaluation.PatternEvaluator
+    threat_search: 'vcf', 'vct' or None. Mode of threat_search.ThreatSpaceSearch run
+        before the alpha-beta search, to find forced wins by continuous threats
+    check_interval: number of nodes between clock checks, when search() has a deadline
+    verbose: whether to print progress of the search
+    stats_log: path to append statistics of every search to (JSON lines), or None
+    opening_book: path of a book built by opening_book.py, or None. Its move is played without searching
+    reuse: whether to keep the transposition table and move ordering between searches, when the next search
+        is from the position after the agent's move and one reply (see advance())
+    '''
+    def __init__(self, env, player_index = None, transposition_size = 2**20, replacement = 'depth', mode = 'priority', threat_search = 'vcf', check_interval = 1000, verbose = True, stats_log = None, opening_book = None, reuse = True):
+        assert mode in ('priority', 'numeric'), 'mode should be one of: priority, numeric'
         self.env = env
         self.player_index = player_index
-        self.opponent_index = self.env.player_info[self.env.player_info.index != player_index].index[0]
+        self.opponent_index = self.env.players.other(player_index)
         self.action = None
+        self.mode = mode
+        if self.mode == 'numeric':
+            self.stone = self.env.players.stone_code[player_index]
+            self.env.attach_evaluator(PatternEvaluator(self.env.board_size, self.env.win_condition))
+        # Incremental 3*3 legality, so illegal moves are never searched
+        self.env.attach_legality(LegalityMask(self.env.board_size))
+
+        # Threat space search for forced wins, run before the full width search
+        self.threat_search = ThreatSpaceSearch(self.env, mode = threat_search) if threat_search is not None else None
+
+        # Book moves of opening positions, loaded on the first lookup
+        self.opening_book = OpeningBook(opening_book) if opening_book is not None else None
+
+        # Transposition table shared by every iteration of the search
+        self.transposition_table = TranspositionTable(size = transposition_size, replacement = replacement)
+        # Killer moves and history table
+        self.move_ordering = MoveOrdering(self.env)
+        # Number of positions searched, and principal variation of the last iteration
+        self.nodes = 0
+        self.pv = list()
+        # Root position of the last search, to continue from it on the next move
+        self.reuse = reuse
+        self.root_board = None
+        # Statistics of every iteration of the last search
+        self.stats = SearchStats(log_path = stats_log)
+
+        # Time management: search stops cleanly at the deadline (time.time() value)
+        self.check_interval = check_interval
+        self.deadline = None
+        self.max_nodes = None
+        self.next_check = float('inf')
+        # threading.Event which stops the search like the deadline when set (see ponder.Ponderer)
+        self.stop_event = None
+        self.verbose = verbose
 
         #### Evaluation of values ( domain dependent ) ####
         # Priority needed in iterative deepening alpha beta search, because of "Unknown" perception
@@ -24,8 +87,175 @@ class Iterative_Deepening_Alpha_Beta():
         else:
             return 'tie'
 
+    def perceive_score(self, winner):
+        # Win
+        if winner == self.player_index:
+            return WIN_SCORE
+        # Lose
+        elif winner == self.opponent_index:
+            return -WIN_SCORE
+        # Tie
+        else:
+            return 0
+
+    def tt_cutoff(self, bound, value, alpha, beta):
+        '''Whether a value stored in the transposition table can be returned without searching'''
+        if bound == TranspositionTable.EXACT:
+            return True
+        # Lower bound which would cause beta cutoff
+        elif bound == TranspositionTable.LOWER:
+            return self.priority_min.index(value) >= self.priority_min.index(beta)
+        # Upper bound which would cause alpha cutoff
+        else:
+            return self.priority_max.index(value) <= self.priority_max.index(alpha)
+
+    def tt_cutoff_score(self, bound, value, alpha, beta):
+        '''tt_cutoff() for scores of numeric mode'''
+        if bound == TranspositionTable.EXACT:
+            return True
+        elif bound == TranspositionTable.LOWER:
+            return value >= beta
+        else:
+            return value <= alpha
+
+    def ordered_actions(self, best_move, player_index, remaining_depth):
+        '''Actions of current state in search order, for player_index to move'''
+        opponent_index = self.opponent_index if player_index == self.player_index else self.player_index
+        return self.move_ordering.order(self.env.actions(), self.depth, best_move, player_index, opponent_index, threats = remaining_depth > 1)
+
+    def order_root(self):
+        '''Order root actions: best action of the previous iteration first, then by move ordering'''
+        self.actions = self.move_ordering.order(self.actions, self.depth, self.action, self.player_index, self.opponent_index)
+
+    def principal_variation(self):
+        '''Return list of moves expected from the current state, following best moves in the transposition table'''
+        pv = list()
+        player_index, opponent_index = self.player_index, self.opponent_index
+        while len(pv) < self.max_depth:
+            entry = self.transposition_table.probe(self.env.hash) if len(pv) > 0 else None
+            move = self.action if len(pv) == 0 else (entry[4] if entry is not None else None)
+            if move is None or self.env.backend.get(move) != 0:
+                break
+            pv.append(move)
+            _, done = self.env.push(move, player_index)
+            player_index, opponent_index = opponent_index, player_index
+            if done:
+                break
+        for _ in pv:
+            self.env.pop()
+        return pv
+
+    def search_book(self):
+        '''Look up the position in the opening book. If found, set self.action to the book move'''
+        if self.opening_book is None:
+            return False
+        move = self.opening_book.probe(self.env)
+        if move is None or self.env.legality.is_illegal(move, self.env.players.stone_code[self.player_index]):
+            return False
+        if self.verbose:
+            print('book move: %s'%(move,))
+        self.action = move
+        return True
+
+    def search_threats(self):
+        '''Look for a forced win by continuous threats. If found, set self.action to its first move'''
+        if self.threat_search is None:
+            return False
+        sequence = self.threat_search.solve(self.player_index, self.deadline, self.stop_event)
+        if sequence is None:
+            return False
+        if self.verbose:
+            print('forced win found: %s moves'%(len(sequence)))
+        self.action = sequence[0]
+        return True
+
+    def advance(self, state):
+        '''Keep the transposition table and move ordering of the previous search if state is its root position
+        after the agent's move and one reply, or the same position (e.g. searched while pondering), and clear them otherwise.
+        Returns (max_depth of the first iteration, expected best move or None).
+        If the reply is the one of the principal variation, the search continues from the depth
+        completed by the previous search less the two moves played, starting with the next move of the variation.
+        In the same position, it repeats the completed depth (answered by the transposition table)
+        and goes on deeper, starting with the previous best move.
+        After pondering on a reply (ponder.Ponderer) which the opponent did not play, the tables are kept too,
+        for the position with the other reply at the same ply'''
+        max_depth, expected_action = 2, None
+        follows = False
+        # Plies between the previous root and state, to shift the killer moves
+        plies = 0
+        if self.reuse and self.root_board is not None and self.action is not None and self.root_board.shape == state.shape:
+            previous = self.root_board.flatten()
+            stones = np.asarray(state).flatten()
+            changed = np.flatnonzero(stones != previous).tolist()
+            completed_depth = self.stats.depth()
+            if len(changed) == 0:
+                follows = True
+                if completed_depth is not None:
+                    max_depth = completed_depth
+                    expected_action = self.action
+            elif len(changed) == 2 and self.action in changed and all(previous[cell] == 0 for cell in changed):
+                reply = changed[0] if changed[1] == self.action else changed[1]
+                follows = (stones[self.action] == self.env.players.stone_code[self.player_index]
+                           and stones[reply] == self.env.players.stone_code[self.opponent_index])
+                plies = 2
+                if follows and len(self.pv) >= 2 and self.pv[1] == reply and completed_depth is not None:
+                    max_depth = max(2, completed_depth - 2)
+                    expected_action = self.pv[2] if len(self.pv) >= 3 else None
+            elif len(changed) == 2:
+                # Pondered reply taken back and another one played instead
+                opponent_stone = self.env.players.stone_code[self.opponent_index]
+                taken, played = changed if stones[changed[0]] == 0 else changed[::-1]
+                follows = (previous[taken] == opponent_stone and stones[taken] == 0
+                           and previous[played] == 0 and stones[played] == opponent_stone)
+        if follows:
+            self.transposition_table.new_generation()
+            self.move_ordering.advance(plies)
+        else:
+            self.transposition_table.clear()
+            self.move_ordering.clear()
+        self.root_board = np.array(state, copy = True)
+        return max_depth, expected_action
+
+    def start_clock(self, deadline, max_nodes = None):
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        # Node count of the next check (never, without deadline or node budget)
+        self.next_check = float('inf')
+        if deadline is not None:
+            self.next_check = self.check_interval
+        if max_nodes is not None:
+            self.next_check = min(self.next_check, max_nodes)
+        # History length of the root, to undo moves of an interrupted iteration
+        self.root_ply = len(self.env.history)
+
+    def check_time(self):
+        '''Called every check_interval nodes. Raise SearchTimeout if the deadline has passed or max_nodes are searched'''
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+        self.next_check = self.nodes + self.check_interval if self.deadline is not None else float('inf')
+        if self.max_nodes is not None:
+            self.next_check = min(self.next_check, self.max_nodes)
+
+    def unwind(self):
+        '''Undo moves of an interrupted iteration, back to the root'''
+        while len(self.env.history) > self.root_ply:
+            self.env.pop()
+        self.depth = 1
+
+    def next_iteration_fits(self, iteration_time, previous_time):
+        '''Whether the next iteration is expected to finish before the deadline.
+        Its time is estimated from the growth of time per iteration (effective branching factor)'''
+        if self.deadline is None:
+            return True
+        growth = iteration_time / previous_time if previous_time > 0 else 1.0
+        return time.time() + iteration_time * max(growth, 1.0) < self.deadline
+
     # Iterative deepening alpha beta search
-    def search(self, state):
+    def search(self, state, deadline = None, max_nodes = None, depth_limit = None):
         '''
         Iterative Deepening Alpha-Beta search.
         with skip criterion v <= alpha, v >= beta
@@ -34,72 +264,153 @@ class Iterative_Deepening_Alpha_Beta():
         faster, since there's more skipping than "skip criterion v < alpha, v > beta"
         but provides less various actions since all equivalent actions are not searched,
         and an action is fixed as the one which gives its 1st maximum value.
+
+        deadline: time.time() value to stop at, or None. The search stops before an iteration
+        which is not expected to finish, or in the middle of one at the deadline,
+        and returns the best action of the last completed iteration.
+        max_nodes: node budget, or None. Stops in the middle of an iteration like deadline
+        depth_limit: max_depth of the last iteration, or None (e.g. fixed depth searches of benchmarks)
         '''
+        if self.mode == 'numeric':
+            return self.search_score(state, deadline, max_nodes, depth_limit)
+
+        # Continue from the previous search, if state follows it
+        self.max_depth, expected_action = self.advance(state)
         self.action = None
-        self.max_depth = 2
         self.depth = 1
-        self.actions = self.env.actions(state)
+        # Copy the board once, then search with push()/pop() on it (actions() of the root are the agent's)
+        self.env.set_turn(self.player_index)
+        self.env.board = state.copy()
+        self.nodes = 0
+        self.pv = list()
+        self.start_clock(deadline, max_nodes)
+        self.stats.start_search()
+        if self.search_book() or self.search_threats():
+            self.stats.end_search(self.action, self.nodes)
+            return self.action
+        self.actions = self.env.actions()
+        num_empty = self.env.board_size * self.env.board_size - self.env.num_stones
 
         # Shuffle actions to speed up search
         np.random.shuffle(self.actions)
+        # The move expected by the previous search is searched first
+        if expected_action in self.actions:
+            self.action = expected_action
 
         beta = self.priority_min[-1]
         v = self.priority_max[0]
-        # Loop until v is maximum
-        while(v != self.priority_max[-1]):
-            print('searching with max_depth:%s'%(self.max_depth))
+        iteration_time = 0.0
+        # Loop until v is maximum, or the whole game is searched
+        while(v != self.priority_max[-1] and self.max_depth <= num_empty and (depth_limit is None or self.max_depth <= depth_limit)):
+            if self.verbose:
+                print('searching with max_depth:%s, TT hit rate: %.3f, nodes: %s'%(self.max_depth, self.transposition_table.hit_rate(), self.nodes))
+            # Search the best action so far first
+            self.order_root()
+            iteration_start = time.time()
+            self.stats.start_iteration(self.max_depth, self.nodes, self.transposition_table)
             # When alpha == v in the same node, then alpha & v will always be the same in that node
             # So omit alpha
             v = self.priority_max[0]
-            # 1. Search for nodes that are not searched fully
-            for action in self.actions:
-                # 1] Get v_min
-                # 1-1] Perform action
-                self.env.board = state.copy()
-                _, winner, done, _ = self.env.step(action, self.player_index)
-                # 1-2] If next state is terminal state
-                if done == True:
-                    v_min = self.perceive(winner)
-                # 1-3] Game goes on (Game didn't end)
-                else:
-                    v_min = self.min_value(self.env.board, v, beta)
-                # 2] v = max(v, v_min) for priority_max,
-                if self.priority_max.index(v) < self.priority_max.index(v_min):
-                    v = v_min
-                    self.action = action
+            best_action = None
+            try:
+                # 1. Search for nodes that are not searched fully
+                for action in self.actions:
+                    self.nodes += 1
+                    # 1] Get v_min
+                    # 1-1] Perform action
+                    winner, done = self.env.push(action, self.player_index)
+                    # 1-2] If next state is terminal state
+                    if done == True:
+                        v_min = self.perceive(winner)
+                    # 1-3] Game goes on (Game didn't end)
+                    else:
+                        v_min = self.min_value(v, beta)
+                    # 1-4] Undo action
+                    self.env.pop()
+                    # 2] v = max(v, v_min) for priority_max,
+                    if self.priority_max.index(v) < self.priority_max.index(v_min):
+                        v = v_min
+                        best_action = action
+            # Deadline: keep the action of the last completed iteration
+            except SearchTimeout:
+                self.unwind()
+                # Interrupted first iteration: the first action in search order (wins and blocks first)
+                if self.action is None:
+                    self.action = self.actions[0]
+                self.stats.end_iteration(self.nodes, self.transposition_table, completed = False)
+                break
+            if best_action is not None:
+                self.action = best_action
+            # Every action loses: the first action in search order (blocks first)
+            elif self.action is None:
+                self.action = self.actions[0]
+            self.pv = self.principal_variation()
+            self.stats.end_iteration(self.nodes, self.transposition_table)
             self.max_depth += 1
+            # A loss found at this depth is forced, so deeper iterations cannot change it
+            if v == 'lose':
+                break
+            iteration_time, previous_time = time.time() - iteration_start, iteration_time
+            if not self.next_iteration_fits(iteration_time, previous_time):
+                break
+        self.stats.end_search(self.action, self.nodes)
         return self.action
 
-    def max_value(self, state, alpha, beta):
+    def max_value(self, alpha, beta):
         # Assume current state is not terminal state
         v = self.priority_max[0]
         self.depth +=1
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_time()
 
         # 1. Search only when (depth <= max_depth)
         if self.depth <= self.max_depth:
-            for action in self.env.actions(state):
+            # 0] Look up transposition table
+            remaining_depth = self.max_depth - self.depth + 1
+            key = self.env.hash
+            entry = self.transposition_table.probe(key)
+            best_move = None
+            if entry is not None:
+                _, entry_depth, bound, value, best_move, _ = entry
+                if entry_depth >= remaining_depth and self.tt_cutoff(bound, value, alpha, beta):
+                    self.depth -= 1
+                    return value
+            alpha_original = alpha
+
+            for move_index, action in enumerate(self.ordered_actions(best_move, self.player_index, remaining_depth)):
                 # 1] Get v_min
                 # 1-1] Perform action
-                self.env.board = state.copy()
-                _, winner, done, _ = self.env.step(action, self.player_index)
+                winner, done = self.env.push(action, self.player_index)
                 # 1-2] If next state is terminal state
                 if done == True:
                     v_min = self.perceive(winner)
                 # 1-3] Game goes on (Game didn't end)
                 else:
-                    v_min = self.min_value(self.env.board, alpha, beta)
+                    v_min = self.min_value(alpha, beta)
+                # 1-4] Undo action
+                self.env.pop()
 
                 # 2] v = max(v, v_min) for priority_max
-                v = self.priority_max[max(self.priority_max.index(v), self.priority_max.index(v_min))]
+                if self.priority_max.index(v) < self.priority_max.index(v_min):
+                    v = v_min
+                    best_move = action
 
                 # 3] if v>=beta for priority_min, return v
                 if self.priority_min.index(v) >= self.priority_min.index(beta):
+                    self.move_ordering.cutoff(action, self.depth, remaining_depth)
+                    self.stats.cutoff(move_index)
+                    self.transposition_table.store(key, remaining_depth, TranspositionTable.LOWER, v, best_move)
                     self.depth -= 1
                     return v
 
                 # 4] alpha = max(alpha, v) for priority_max
                 alpha = self.priority_max[max(self.priority_max.index(alpha), self.priority_max.index(v))]
             # End of search
+            if self.priority_max.index(v) > self.priority_max.index(alpha_original):
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.EXACT, v, best_move)
+            else:
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.UPPER, v, best_move)
             self.depth -= 1
             return v
 
@@ -108,36 +419,61 @@ class Iterative_Deepening_Alpha_Beta():
             self.depth -= 1
             return 'unknown'
 
-    def min_value(self, state, alpha, beta):
+    def min_value(self, alpha, beta):
         # Assume current state is not terminal state
         v = self.priority_min[-1]
         self.depth +=1
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_time()
 
         # 1. Search only when (depth <= max_depth)
         if self.depth <= self.max_depth:
-            for action in self.env.actions(state):
+            # 0] Look up transposition table
+            remaining_depth = self.max_depth - self.depth + 1
+            key = self.env.hash
+            entry = self.transposition_table.probe(key)
+            best_move = None
+            if entry is not None:
+                _, entry_depth, bound, value, best_move, _ = entry
+                if entry_depth >= remaining_depth and self.tt_cutoff(bound, value, alpha, beta):
+                    self.depth -= 1
+                    return value
+            beta_original = beta
+
+            for move_index, action in enumerate(self.ordered_actions(best_move, self.opponent_index, remaining_depth)):
                 # 1] Get v_max
                 # 1-1] Perform action
-                self.env.board = state.copy()
-                _, winner, done, _ = self.env.step(action, self.opponent_index)
+                winner, done = self.env.push(action, self.opponent_index)
                 # 1-2] If next state is terminal state
                 if done == True:
                     v_max = self.perceive(winner)
                 # 1-3] Game goes on (Game didn't end)
                 else:
-                    v_max = self.max_value(self.env.board, alpha, beta)
+                    v_max = self.max_value(alpha, beta)
+                # 1-4] Undo action
+                self.env.pop()
 
                 # 2] v = min(v, v_max) for priority_min
-                v = self.priority_min[min(self.priority_min.index(v), self.priority_min.index(v_max))]
+                if self.priority_min.index(v) > self.priority_min.index(v_max):
+                    v = v_max
+                    best_move = action
 
                 # 3] if v<=alpha for priority_max, return v
                 if self.priority_max.index(v) <= self.priority_max.index(alpha):
+                    self.move_ordering.cutoff(action, self.depth, remaining_depth)
+                    self.stats.cutoff(move_index)
+                    self.transposition_table.store(key, remaining_depth, TranspositionTable.UPPER, v, best_move)
                     self.depth -= 1
                     return v
 
                 # 4] beta = min(beta, v) for priority_min
                 beta = self.priority_min[min(self.priority_min.index(beta), self.priority_min.index(v))]
             # End of search
+            if self.priority_min.index(v) < self.priority_min.index(beta_original):
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.EXACT, v, best_move)
+            else:
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.LOWER, v, best_move)
             self.depth -= 1
             return v
 
@@ -145,3 +481,193 @@ class Iterative_Deepening_Alpha_Beta():
         else:
             self.depth -= 1
             return 'unknown'
+
+    # Iterative deepening alpha beta search on scores
+    def search_score(self, state, deadline = None, max_nodes = None, depth_limit = None):
+        '''
+        Iterative Deepening Alpha-Beta search on evaluation scores (mode = 'numeric').
+        Positions at max_depth are scored by PatternEvaluator, so every iteration
+        ranks the actions, and the best action of the last iteration is searched first.
+        '''
+        # Continue from the previous search, if state follows it
+        self.max_depth, expected_action = self.advance(state)
+        self.action = None
+        self.depth = 1
+        # Copy the board once, then search with push()/pop() on it (actions() of the root are the agent's)
+        self.env.set_turn(self.player_index)
+        self.env.board = state.copy()
+        self.nodes = 0
+        self.pv = list()
+        self.start_clock(deadline, max_nodes)
+        self.stats.start_search()
+        if self.search_book() or self.search_threats():
+            self.stats.end_search(self.action, self.nodes)
+            return self.action
+        self.actions = self.env.actions()
+        num_empty = self.env.board_size * self.env.board_size - self.env.num_stones
+
+        # Shuffle actions to speed up search
+        np.random.shuffle(self.actions)
+        # The move expected by the previous search is searched first
+        if expected_action in self.actions:
+            self.action = expected_action
+
+        v = 0
+        iteration_time = 0.0
+        # Loop until the game result is known, or the whole game is searched
+        while(abs(v) < WIN_SCORE and self.max_depth <= num_empty and (depth_limit is None or self.max_depth <= depth_limit)):
+            if self.verbose:
+                print('searching with max_depth:%s, TT hit rate: %.3f, nodes: %s'%(self.max_depth, self.transposition_table.hit_rate(), self.nodes))
+            # Search the best action so far first
+            self.order_root()
+            iteration_start = time.time()
+            self.stats.start_iteration(self.max_depth, self.nodes, self.transposition_table)
+            v = -INFINITY
+            best_action = None
+            try:
+                for action in self.actions:
+                    self.nodes += 1
+                    # 1] Get v_min
+                    # 1-1] Perform action
+                    winner, done = self.env.push(action, self.player_index)
+                    # 1-2] If next state is terminal state
+                    if done == True:
+                        v_min = self.perceive_score(winner)
+                    # 1-3] Game goes on (Game didn't end)
+                    else:
+                        v_min = self.min_score(v, INFINITY)
+                    # 1-4] Undo action
+                    self.env.pop()
+                    # 2] v = max(v, v_min)
+                    if v < v_min:
+                        v = v_min
+                        best_action = action
+            # Deadline: keep the action of the last completed iteration
+            except SearchTimeout:
+                self.unwind()
+                # Interrupted first iteration: the first action in search order (wins and blocks first)
+                if self.action is None:
+                    self.action = self.actions[0]
+                self.stats.end_iteration(self.nodes, self.transposition_table, completed = False)
+                break
+            self.action = best_action
+            self.pv = self.principal_variation()
+            self.stats.end_iteration(self.nodes, self.transposition_table)
+            self.max_depth += 1
+            iteration_time, previous_time = time.time() - iteration_start, iteration_time
+            if not self.next_iteration_fits(iteration_time, previous_time):
+                break
+        self.stats.end_search(self.action, self.nodes)
+        return self.action
+
+    def max_score(self, alpha, beta):
+        # Assume current state is not terminal state
+        self.depth +=1
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_time()
+
+        # 1. Blocked by max_depth
+        if self.depth > self.max_depth:
+            self.depth -= 1
+            return self.env.evaluator.evaluate(self.stone)
+
+        # 2. Look up transposition table
+        remaining_depth = self.max_depth - self.depth + 1
+        key = self.env.hash
+        entry = self.transposition_table.probe(key)
+        best_move = None
+        if entry is not None:
+            _, entry_depth, bound, value, best_move, _ = entry
+            if entry_depth >= remaining_depth and self.tt_cutoff_score(bound, value, alpha, beta):
+                self.depth -= 1
+                return value
+        alpha_original = alpha
+
+        # 3. Search
+        v = -INFINITY
+        for move_index, action in enumerate(self.ordered_actions(best_move, self.player_index, remaining_depth)):
+            # 1] Get v_min
+            winner, done = self.env.push(action, self.player_index)
+            if done == True:
+                v_min = self.perceive_score(winner)
+            else:
+                v_min = self.min_score(alpha, beta)
+            self.env.pop()
+
+            # 2] v = max(v, v_min)
+            if v < v_min:
+                v = v_min
+                best_move = action
+
+            # 3] if v>=beta, return v
+            if v >= beta:
+                self.move_ordering.cutoff(action, self.depth, remaining_depth)
+                self.stats.cutoff(move_index)
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.LOWER, v, best_move)
+                self.depth -= 1
+                return v
+
+            # 4] alpha = max(alpha, v)
+            alpha = max(alpha, v)
+        # End of search
+        bound = TranspositionTable.EXACT if v > alpha_original else TranspositionTable.UPPER
+        self.transposition_table.store(key, remaining_depth, bound, v, best_move)
+        self.depth -= 1
+        return v
+
+    def min_score(self, alpha, beta):
+        # Assume current state is not terminal state
+        self.depth +=1
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_time()
+
+        # 1. Blocked by max_depth
+        if self.depth > self.max_depth:
+            self.depth -= 1
+            return self.env.evaluator.evaluate(self.stone)
+
+        # 2. Look up transposition table
+        remaining_depth = self.max_depth - self.depth + 1
+        key = self.env.hash
+        entry = self.transposition_table.probe(key)
+        best_move = None
+        if entry is not None:
+            _, entry_depth, bound, value, best_move, _ = entry
+            if entry_depth >= remaining_depth and self.tt_cutoff_score(bound, value, alpha, beta):
+                self.depth -= 1
+                return value
+        beta_original = beta
+
+        # 3. Search
+        v = INFINITY
+        for move_index, action in enumerate(self.ordered_actions(best_move, self.opponent_index, remaining_depth)):
+            # 1] Get v_max
+            winner, done = self.env.push(action, self.opponent_index)
+            if done == True:
+                v_max = self.perceive_score(winner)
+            else:
+                v_max = self.max_score(alpha, beta)
+            self.env.pop()
+
+            # 2] v = min(v, v_max)
+            if v > v_max:
+                v = v_max
+                best_move = action
+
+            # 3] if v<=alpha, return v
+            if v <= alpha:
+                self.move_ordering.cutoff(action, self.depth, remaining_depth)
+                self.stats.cutoff(move_index)
+                self.transposition_table.store(key, remaining_depth, TranspositionTable.UPPER, v, best_move)
+                self.depth -= 1
+                return v
+
+            # 4] beta = min(beta, v)
+            beta = min(beta, v)
+        # End of search
+        bound = TranspositionTable.EXACT if v < beta_original else TranspositionTable.LOWER
+        self.transposition_table.store(key, remaining_depth, bound, v, best_move)
+        self.depth -= 1
+        return v
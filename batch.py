@@ -0,0 +1,144 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Functions on stacks of boards, shape (B, N, N), with stone codes 1 (black), -1 (white) and 0 (empty).
+# Every function works on whole arrays: there is no Python loop over boards or cells.
+
+# Line directions (row step, column step): right, down, down-right, down-left
+LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+# Stone codes, in the order of the last axis of pattern_counts() results
+STONES = (1, -1)
+
+def as_boards(boards):
+    '''Stack of boards as int8 array (B, N, N). A single (N, N) board becomes a stack of one'''
+    boards = np.asarray(boards, dtype = np.int8)
+    if boards.ndim == 2:
+        boards = boards[np.newaxis]
+    return boards
+
+def shifted(padded, pad, size, d_row, d_column):
+    '''View (B, size, size) of boards padded by pad cells on every side, moved by (d_row, d_column):
+    result[b, r, c] = board[b, r + d_row, c + d_column], or the padding value outside the board'''
+    return padded[:, pad + d_row : pad + d_row + size, pad + d_column : pad + d_column + size]
+
+def line_views(mask, length):
+    '''Views of bool mask (B, N, N) along every line direction, for lines starting at every cell of the board padded by one cell.
+    Returns list of 4 lists (one per LINE_DIRECTIONS) of "length" views (B, N + 2, N + 2):
+    views[d][k][b, r, c] = mask[b, r - 1 + k * d_row, c - 1 + k * d_column], False outside the board.
+    Lines touching the edge are included, and no array of windows is materialized'''
+    board_size = mask.shape[1]
+    padded = np.pad(mask, ((0, 0), (length, length), (length, length)))
+    return [[shifted(padded, length, board_size + 2, k * d_row - 1, k * d_column - 1) for k in range(length)]
+            for d_row, d_column in LINE_DIRECTIONS]
+
+def count_views(views, start, stop):
+    '''Number of True among views[start:stop], as int8 array'''
+    count = np.zeros(views[0].shape, dtype = np.int8)
+    for view in views[start:stop]:
+        count += view
+    return count
+
+def candidate_mask(boards, candidate_distance = 1):
+    '''Empty cells within candidate_distance of any stone, as bool array (B, N, N).
+    On empty boards every cell is a candidate (like Gomoku.actions())'''
+    boards = as_boards(boards)
+    occupied = boards != 0
+    size = 2 * candidate_distance + 1
+    padded = np.pad(occupied, ((0, 0), (candidate_distance, candidate_distance), (candidate_distance, candidate_distance)))
+    near_stone = sliding_window_view(padded, (size, size), axis = (1, 2)).any(axis = (3, 4))
+    empty_board = ~occupied.any(axis = (1, 2))
+    return ~occupied & (near_stone | empty_board[:, np.newaxis, np.newaxis])
+
+def next_stones(boards):
+    '''Stone code of the side to move of every board (black moves when both have the same number of stones)'''
+    boards = as_boards(boards)
+    black = (boards == 1).sum(axis = (1, 2))
+    white = (boards == -1).sum(axis = (1, 2))
+    return np.where(black <= white, 1, -1).astype(np.int8)
+
+def three_directions(boards, stones):
+    '''Bit mask (B, N, N) of the LINE_DIRECTIONS along which placing stones[b] on the cell
+    makes exactly 3 consecutive stones (bit i for LINE_DIRECTIONS[i])'''
+    boards = as_boards(boards)
+    board_size = boards.shape[1]
+    stones = np.asarray(stones, dtype = np.int8).reshape(-1, 1, 1)
+    own = np.pad(boards == stones, ((0, 0), (3, 3), (3, 3)))
+    threes = np.zeros(boards.shape, dtype = np.int8)
+    for direction_index, (d_row, d_column) in enumerate(LINE_DIRECTIONS):
+        # Consecutive own stones next to the cell, in both directions (up to 3, enough to tell 3 from 4 or more)
+        line_count = np.ones(boards.shape, dtype = np.int8)
+        for sign in (-1, 1):
+            run = np.ones(boards.shape, dtype = bool)
+            for k in range(1, 4):
+                run = run & shifted(own, 3, board_size, sign * k * d_row, sign * k * d_column)
+                line_count += run
+        threes |= (line_count == 3).astype(np.int8) << direction_index
+    return threes
+
+def double_three_mask(boards, stones):
+    '''Empty cells where placing stones[b] makes exactly two lines of exactly 3 consecutive stones
+    (the 3*3 rule of Gomoku.is_illegal), as bool array (B, N, N)'''
+    boards = as_boards(boards)
+    threes = three_directions(boards, stones)
+    num_threes = np.zeros(boards.shape, dtype = np.int8)
+    for direction_index in range(len(LINE_DIRECTIONS)):
+        num_threes += (threes >> direction_index) & 1
+    return (boards == 0) & (num_threes == 2)
+
+def legal_candidate_mask(boards, candidate_distance = 1, stones = None):
+    '''candidate_mask() without the cells illegal for the side to move (stones, or next_stones(boards))'''
+    boards = as_boards(boards)
+    if stones is None:
+        stones = next_stones(boards)
+    return candidate_mask(boards, candidate_distance) & ~double_three_mask(boards, stones)
+
+def five_counts(boards, win_condition = 5):
+    '''Number of runs of exactly win_condition stones, as int array (B, 2) for STONES'''
+    boards = as_boards(boards)
+    counts = np.zeros((boards.shape[0], len(STONES)), dtype = np.int64)
+    for i, stone in enumerate(STONES):
+        for views in line_views(boards == stone, win_condition + 2):
+            # Stone-free cell (or outside), win_condition stones, stone-free cell
+            runs = ~views[0] & ~views[-1]
+            for view in views[1:-1]:
+                runs &= view
+            counts[:, i] += runs.sum(axis = (1, 2))
+    return counts
+
+def terminal_test(boards, win_condition = 5):
+    '''Return (done, winner_stone): bool array (B,), and int array (B,) of the stone code
+    which made exactly win_condition in a row (0 if none). Full boards are done'''
+    boards = as_boards(boards)
+    fives = five_counts(boards, win_condition)
+    winner_stone = np.where(fives[:, 0] > 0, 1, np.where(fives[:, 1] > 0, -1, 0)).astype(np.int8)
+    full = (boards != 0).all(axis = (1, 2))
+    return (winner_stone != 0) | full, winner_stone
+
+def pattern_counts(boards, win_condition = 5):
+    '''Count threat patterns of both stones on every board.
+    Returns {name: int array (B, 2) for STONES}, with windows of every line direction:
+        'five': runs of exactly win_condition stones
+        'open_four': empty, win_condition - 1 stones, empty
+        'four': windows of win_condition cells with win_condition - 1 stones and one empty cell
+        'open_three': windows of win_condition + 1 cells with empty ends, and win_condition - 2 stones
+            and one empty cell inside (e.g. _XXX__, _X_XX_)'''
+    boards = as_boards(boards)
+    w = win_condition
+    num_boards = boards.shape[0]
+    counts = {name: np.zeros((num_boards, len(STONES)), dtype = np.int64) for name in ('open_four', 'four', 'open_three')}
+    counts['five'] = five_counts(boards, w)
+    empty_views = line_views(boards == 0, w + 1)
+    for i, stone in enumerate(STONES):
+        for direction_index, views in enumerate(line_views(boards == stone, w + 1)):
+            empty = empty_views[direction_index]
+            # 1. Lines of w + 1 cells: open patterns
+            ends_empty = empty[0] & empty[-1]
+            inner_stones = count_views(views, 1, w)
+            inner_empty = count_views(empty, 1, w)
+            counts['open_four'][:, i] += (ends_empty & (inner_stones == w - 1)).sum(axis = (1, 2))
+            counts['open_three'][:, i] += (ends_empty & (inner_stones == w - 2) & (inner_empty == 1)).sum(axis = (1, 2))
+            # 2. Lines of w cells (the first w cells)
+            stones_in = inner_stones + views[0]
+            empty_in = inner_empty + empty[0]
+            counts['four'][:, i] += ((stones_in == w - 1) & (empty_in == 1)).sum(axis = (1, 2))
+    return counts
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from gomoku import Gomoku
+from agent import Iterative_Deepening_Alpha_Beta
+from threat_search import ThreatSpaceSearch
+
+POSITIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_positions.json')
+MODES = ('numeric', 'priority')
+
+def load_positions(path = POSITIONS_PATH):
+    '''Stored positions: list of dicts with name, category, board_size, win_condition, search_depth,
+    and either moves (cells played from the empty board) or board (rows of stone codes, black to move)'''
+    with open(path) as f:
+        return json.load(f)
+
+def build(position):
+    '''Return Gomoku env at the position'''
+    env = Gomoku(board_size = position['board_size'], win_condition = position['win_condition'])
+    if 'board' in position:
+        env.board = np.array(position['board'])
+    else:
+        for cell in position['moves']:
+            env.push(cell)
+    return env
+
+def time_calls(function, args_list, repeat = 5, min_seconds = 0.02):
+    '''Microseconds per call of function(*args) over args_list, best of repeat rounds.
+    Each round calls over args_list as many times as needed to take at least min_seconds'''
+    # Number of passes over args_list per round
+    start_time = time.perf_counter()
+    for args in args_list:
+        function(*args)
+    seconds = time.perf_counter() - start_time
+    passes = max(1, int(min_seconds / seconds) + 1) if seconds > 0 else 1000
+
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(passes):
+            for args in args_list:
+                function(*args)
+        best = min(best, (time.perf_counter() - start_time) / (passes * len(args_list)))
+    return best * 1e6
+
+def bench_position(position, repeat = 5, search = True, search_repeat = 3):
+    '''Return {metric: value} of one position. Metrics ending in "_us" and "seconds" are times (lower is better).
+    Searches are timed as the best of search_repeat runs'''
+    env = build(position)
+    num_cells = env.board_size * env.board_size
+    stone_cells = [cell for cell in range(num_cells) if env.backend.get(cell) != 0]
+    empty_cells = [cell for cell in range(num_cells) if env.backend.get(cell) == 0]
+
+    results = dict()
+    # 1. Environment functions
+    results['actions_us'] = time_calls(env.actions, [()] * 100, repeat)
+    results['terminal_test_us'] = time_calls(env.terminal_test, [(cell,) for cell in stone_cells], repeat)
+    results['is_illegal_us'] = time_calls(env.is_illegal, [(cell, stone) for cell in empty_cells for stone in (1, -1)], repeat)
+    results['count_consecutive_stones_us'] = time_calls(env.count_consecutive_stones,
+                                                        [(cell, direction) for cell in stone_cells for direction in env.direction], repeat)
+
+    # 2. Search to a fixed depth, with fixed random seed so nodes are comparable
+    if search:
+        # Threat search on its own (the agents below skip it, so they always run alpha-beta)
+        threat_search = ThreatSpaceSearch(env, mode = 'vcf')
+        seconds = float('inf')
+        for _ in range(search_repeat):
+            start_time = time.perf_counter()
+            sequence = threat_search.solve(env.next_player)
+            seconds = min(seconds, time.perf_counter() - start_time)
+        results['vcf_seconds'] = seconds
+        results['vcf_nodes'] = threat_search.nodes
+        results['vcf_action'] = sequence[0] if sequence is not None else None
+
+        for mode in MODES:
+            agent = Iterative_Deepening_Alpha_Beta(Gomoku(board_size = env.board_size, win_condition = env.win_condition),
+                                                   env.next_player, mode = mode, threat_search = None, verbose = False, reuse = False)
+            seconds = float('inf')
+            for _ in range(search_repeat):
+                np.random.seed(0)
+                start_time = time.perf_counter()
+                action = agent.search(env.board, depth_limit = position['search_depth'])
+                seconds = min(seconds, time.perf_counter() - start_time)
+            results['search_%s_seconds'%(mode)] = seconds
+            results['search_%s_nodes'%(mode)] = agent.nodes
+            results['search_%s_nps'%(mode)] = agent.nodes / seconds if seconds > 0 else None
+            results['search_%s_action'%(mode)] = action
+    return results
+
+def run(positions, repeat = 5, search = True, search_repeat = 3):
+    '''Benchmark every position. Returns machine-readable result (dict)'''
+    result = {
+    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    'python': sys.version.split()[0],
+    'platform': platform.platform(),
+    'processor': platform.processor(),
+    'positions': dict(),
+    }
+    for position in positions:
+        result['positions'][position['name']] = bench_position(position, repeat, search, search_repeat)
+    return result
+
+def is_time(metric):
+    return metric.endswith('_us') or metric.endswith('_seconds')
+
+def compare(result, baseline, tolerance = 0.1):
+    '''Compare times of result with baseline. Returns list of (position, metric, baseline, current, ratio, regressed).
+    A time regresses when current > baseline * (1 + tolerance)'''
+    rows = list()
+    for name, metrics in result['positions'].items():
+        baseline_metrics = baseline['positions'].get(name)
+        if baseline_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            base = baseline_metrics.get(metric)
+            if not is_time(metric) or base is None or value is None or base <= 0:
+                continue
+            ratio = value / base
+            rows.append((name, metric, base, value, ratio, ratio > 1 + tolerance))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the environment and agent on stored positions')
+    parser.add_argument('--positions', default = POSITIONS_PATH)
+    parser.add_argument('--only', nargs = '*', default = None, help = 'names or categories of positions to run')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--search-repeat', type = int, default = 3)
+    parser.add_argument('--no-search', action = 'store_true', help = 'skip the fixed depth searches')
+    parser.add_argument('--output', default = None, help = 'file to save results to (JSON)')
+    parser.add_argument('--baseline', default = None, help = 'saved results to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    positions = load_positions(args.positions)
+    if args.only:
+        positions = [position for position in positions if position['name'] in args.only or position['category'] in args.only]
+    result = run(positions, args.repeat, not args.no_search, args.search_repeat)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent = 1)
+    else:
+        print(json.dumps(result, indent = 1))
+
+    # Regression against baseline: exit code 1 if any time regressed
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(result, baseline, args.tolerance)
+        for name, metric, base, value, ratio, regressed in rows:
+            print('%-20s %-32s %12.3f %12.3f %7.2fx %s'%(name, metric, base, value, ratio, 'REGRESSED' if regressed else ''), file = sys.stderr)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import numpy as np
+
+# Scan directions (row step, column step), in the order of Gomoku.direction ['-1', '0', '1', 'inf']
+DIRECTIONS = ((1, 1), (0, 1), (-1, 1), (-1, 0))
+
+class ArrayBoard():
+    '''Stones stored as flat list of stone codes, indexed by cell = row_index * board_size + column_index.
+    Lines are scanned with precomputed tuples of cell indices.'''
+    def __init__(self, board_size, win_condition):
+        self.board_size = board_size
+        self.win_condition = win_condition
+        self.cells = [0] * (board_size * board_size)
+
+        # line_table[cell][i] = (backward cells, forward cells) along DIRECTIONS[i], up to win_condition cells each
+        self.line_table = list()
+        for row_index in range(board_size):
+            for column_index in range(board_size):
+                lines = list()
+                for d_row, d_column in DIRECTIONS:
+                    scans = list()
+                    for sign in (-1, 1):
+                        cells = list()
+                        scan_row, scan_column = row_index + sign * d_row, column_index + sign * d_column
+                        while 0 <= scan_row < board_size and 0 <= scan_column < board_size and len(cells) < win_condition:
+                            cells.append(scan_row * board_size + scan_column)
+                            scan_row, scan_column = scan_row + sign * d_row, scan_column + sign * d_column
+                        scans.append(tuple(cells))
+                    lines.append(tuple(scans))
+                self.line_table.append(tuple(lines))
+
+    def load(self, board):
+        self.cells = np.asarray(board, dtype = int).flatten().tolist()
+
+    def to_array(self):
+        return np.array(self.cells, dtype = int).reshape(self.board_size, self.board_size)
+
+    def get(self, cell):
+        return self.cells[cell]
+
+    def place(self, cell, stone):
+        self.cells[cell] = stone
+
+    def remove(self, cell):
+        self.cells[cell] = 0
+
+    def stone_cells(self, stone):
+        '''List of cells holding stone'''
+        return [cell for cell, cell_stone in enumerate(self.cells) if cell_stone == stone]
+
+    def count_line(self, cell, direction_index, max_stones):
+        '''Number of consecutive stones through cell along DIRECTIONS[direction_index], up to max_stones'''
+        cells = self.cells
+        stone = cells[cell]
+        # If no stone present
+        if stone == 0:
+            return 0
+        stone_count = 1
+        for scan_cells in self.line_table[cell][direction_index]:
+            for scan_cell in scan_cells:
+                if cells[scan_cell] != stone:
+                    break
+                stone_count += 1
+        return min(stone_count, max_stones)
+
+    def is_win(self, cell):
+        '''Whether the stone on cell is part of exactly win_condition consecutive stones'''
+        cells = self.cells
+        stone = cells[cell]
+        # If no stone present
+        if stone == 0:
+            return False
+        for backward, forward in self.line_table[cell]:
+            stone_count = 1
+            for scan_cell in backward:
+                if cells[scan_cell] != stone:
+                    break
+                stone_count += 1
+            for scan_cell in forward:
+                if cells[scan_cell] != stone:
+                    break
+                stone_count += 1
+            if stone_count == self.win_condition:
+                return True
+        return False
+
+class BitBoard():
+    '''Stones stored as one Python int per stone code.
+
+    Bit (row_index * (board_size + 1) + column_index) is set where the stone is.
+    Every row has one extra guard column that is never set, so shifting by
+    1, board_size, board_size + 1 and board_size + 2 moves along rows, diagonals and columns
+    without wrapping from one row to the next. Patterns are found with shift-and-mask.'''
+    def __init__(self, board_size, win_condition):
+        self.board_size = board_size
+        self.win_condition = win_condition
+        self.width = board_size + 1
+        # Shift of one step along DIRECTIONS[i] (sign does not matter for symmetric patterns)
+        self.shifts = tuple(abs(d_row * self.width + d_column) for d_row, d_column in DIRECTIONS)
+
+        # Bit of every cell, and mask of all cells on the board
+        self.cell_bit = [row_index * self.width + column_index for row_index in range(board_size) for column_index in range(board_size)]
+        self.board_mask = 0
+        for bit in self.cell_bit:
+            self.board_mask |= 1 << bit
+
+        # window_mask[cell][i]: run starts along DIRECTIONS[i] whose win_condition stones would cover cell
+        self.window_mask = list()
+        for bit in self.cell_bit:
+            masks = list()
+            for shift in self.shifts:
+                mask = 0
+                for k in range(win_condition):
+                    if bit - k * shift >= 0:
+                        mask |= 1 << (bit - k * shift)
+                masks.append(mask & self.board_mask)
+            self.window_mask.append(tuple(masks))
+
+        # stones[0] for stone 1, stones[1] for stone -1
+        self.stones = [0, 0]
+
+    def load(self, board):
+        board = np.asarray(board)
+        self.stones = [0, 0]
+        for row_index, column_index in zip(*np.where(board != 0)):
+            stone = board[row_index, column_index]
+            self.stones[(1 - int(stone)) // 2] |= 1 << (int(row_index) * self.width + int(column_index))
+
+    def to_array(self):
+        board = np.zeros((self.board_size, self.board_size), dtype = int)
+        for stone, bits in zip((1, -1), self.stones):
+            while bits:
+                low_bit = bits & -bits
+                row_index, column_index = divmod(low_bit.bit_length() - 1, self.width)
+                board[row_index, column_index] = stone
+                bits ^= low_bit
+        return board
+
+    def get(self, cell):
+        bit = self.cell_bit[cell]
+        if self.stones[0] >> bit & 1:
+            return 1
+        elif self.stones[1] >> bit & 1:
+            return -1
+        return 0
+
+    def place(self, cell, stone):
+        self.stones[(1 - stone) // 2] |= 1 << self.cell_bit[cell]
+
+    def remove(self, cell):
+        bit = ~(1 << self.cell_bit[cell])
+        self.stones[0] &= bit
+        self.stones[1] &= bit
+
+    def stone_cells(self, stone):
+        '''List of cells holding stone'''
+        cells = list()
+        bits = self.stones[(1 - stone) // 2]
+        while bits:
+            low_bit = bits & -bits
+            row_index, column_index = divmod(low_bit.bit_length() - 1, self.width)
+            cells.append(row_index * self.board_size + column_index)
+            bits ^= low_bit
+        return cells
+
+    def empty(self):
+        '''Mask of empty cells'''
+        return self.board_mask & ~(self.stones[0] | self.stones[1])
+
+    def run_starts(self, stone, length, direction_index):
+        '''Mask of bits p where p, p + shift, ..., p + (length - 1) * shift all hold stone'''
+        bits = self.stones[(1 - stone) // 2]
+        shift = self.shifts[direction_index]
+        runs = bits
+        for k in range(1, length):
+            runs &= bits >> (k * shift)
+        return runs
+
+    def exact_runs(self, stone, length, direction_index):
+        '''Run starts of exactly "length" consecutive stones'''
+        bits = self.stones[(1 - stone) // 2]
+        shift = self.shifts[direction_index]
+        return self.run_starts(stone, length, direction_index) & ~(bits << shift) & ~(bits >> (length * shift))
+
+    def open_runs(self, stone, length, direction_index):
+        '''Run starts of exactly "length" consecutive stones with empty cells at both ends (e.g. open three)'''
+        empty = self.empty()
+        shift = self.shifts[direction_index]
+        return self.exact_runs(stone, length, direction_index) & (empty << shift) & (empty >> (length * shift))
+
+    def fives(self, stone):
+        '''Mask of run starts of exactly win_condition stones, in any direction'''
+        mask = 0
+        for direction_index in range(len(self.shifts)):
+            mask |= self.exact_runs(stone, self.win_condition, direction_index)
+        return mask
+
+    def open_threes(self, stone):
+        '''Mask of run starts of open threes, in any direction'''
+        mask = 0
+        for direction_index in range(len(self.shifts)):
+            mask |= self.open_runs(stone, 3, direction_index)
+        return mask
+
+    def count_line(self, cell, direction_index, max_stones):
+        '''Number of consecutive stones through cell along DIRECTIONS[direction_index], up to max_stones'''
+        bit = self.cell_bit[cell]
+        stone = self.get(cell)
+        # If no stone present
+        if stone == 0:
+            return 0
+        bits = self.stones[(1 - stone) // 2]
+        shift = self.shifts[direction_index]
+        stone_count = 1
+        scan_bit = bit - shift
+        while scan_bit >= 0 and bits >> scan_bit & 1 and stone_count < max_stones:
+            stone_count += 1
+            scan_bit -= shift
+        scan_bit = bit + shift
+        while bits >> scan_bit & 1 and stone_count < max_stones:
+            stone_count += 1
+            scan_bit += shift
+        return stone_count
+
+    def is_win(self, cell):
+        '''Whether the stone on cell is part of exactly win_condition consecutive stones'''
+        stone = self.get(cell)
+        # If no stone present
+        if stone == 0:
+            return False
+        for direction_index, window in enumerate(self.window_mask[cell]):
+            if self.exact_runs(stone, self.win_condition, direction_index) & window:
+                return True
+        return False
+
+class SparseBoard():
+    '''Stones stored in a dict {cell: stone code}, for large boards with few stones.
+    Nothing is allocated per cell of the board: memory and the cost of every operation
+    depend on the number of stones (lines are scanned by stepping rows and columns).
+    The bounding box of the stones is kept (for crop()), and recomputed from the stones only after removing one on its edge.'''
+    def __init__(self, board_size, win_condition):
+        self.board_size = board_size
+        self.win_condition = win_condition
+        self.clear()
+
+    def clear(self):
+        self.stones = dict()
+        # (min row, min column, max row, max column) of the stones, or None
+        self.box = None
+        self.box_valid = True
+
+    def load(self, board):
+        board = np.asarray(board)
+        self.clear()
+        for cell in np.flatnonzero(board).tolist():
+            self.place(cell, int(board.flat[cell]))
+
+    def to_array(self):
+        board = np.zeros(self.board_size * self.board_size, dtype = int)
+        for cell, stone in self.stones.items():
+            board[cell] = stone
+        return board.reshape(self.board_size, self.board_size)
+
+    def get(self, cell):
+        return self.stones.get(cell, 0)
+
+    def place(self, cell, stone):
+        self.stones[cell] = stone
+        if self.box_valid:
+            row_index, column_index = divmod(cell, self.board_size)
+            if self.box is None:
+                self.box = (row_index, column_index, row_index, column_index)
+            else:
+                min_row, min_column, max_row, max_column = self.box
+                self.box = (min(min_row, row_index), min(min_column, column_index), max(max_row, row_index), max(max_column, column_index))
+
+    def remove(self, cell):
+        del self.stones[cell]
+        if self.box_valid:
+            row_index, column_index = divmod(cell, self.board_size)
+            min_row, min_column, max_row, max_column = self.box
+            if row_index in (min_row, max_row) or column_index in (min_column, max_column):
+                self.box_valid = False
+
+    def bounding_box(self):
+        '''(min row, min column, max row, max column) of the stones, or None if there is no stone'''
+        if not self.box_valid:
+            self.box = None
+            self.box_valid = True
+            stones = list(self.stones.items())
+            self.stones = dict()
+            for cell, stone in stones:
+                self.place(cell, stone)
+        return self.box
+
+    def crop(self, margin = 0):
+        '''Return (board, first row, first column): the part of the board in the bounding box of the stones
+        grown by margin cells (the center cell, on an empty board), as an array of stone codes'''
+        box = self.bounding_box()
+        if box is None:
+            center = self.board_size // 2
+            box = (center, center, center, center)
+        min_row, min_column = max(0, box[0] - margin), max(0, box[1] - margin)
+        max_row, max_column = min(self.board_size - 1, box[2] + margin), min(self.board_size - 1, box[3] + margin)
+        board = np.zeros((max_row - min_row + 1, max_column - min_column + 1), dtype = int)
+        for cell, stone in self.stones.items():
+            row_index, column_index = divmod(cell, self.board_size)
+            board[row_index - min_row, column_index - min_column] = stone
+        return board, min_row, min_column
+
+    def stone_cells(self, stone):
+        '''List of cells holding stone'''
+        return [cell for cell, cell_stone in self.stones.items() if cell_stone == stone]
+
+    def count_line(self, cell, direction_index, max_stones):
+        '''Number of consecutive stones through cell along DIRECTIONS[direction_index], up to max_stones'''
+        stones = self.stones
+        stone = stones.get(cell, 0)
+        # If no stone present
+        if stone == 0:
+            return 0
+        board_size = self.board_size
+        row_index, column_index = divmod(cell, board_size)
+        d_row, d_column = DIRECTIONS[direction_index]
+        stone_count = 1
+        for sign in (-1, 1):
+            scan_row, scan_column = row_index + sign * d_row, column_index + sign * d_column
+            while (stone_count < max_stones and 0 <= scan_row < board_size and 0 <= scan_column < board_size
+                   and stones.get(scan_row * board_size + scan_column) == stone):
+                stone_count += 1
+                scan_row, scan_column = scan_row + sign * d_row, scan_column + sign * d_column
+        return stone_count
+
+    def is_win(self, cell):
+        '''Whether the stone on cell is part of exactly win_condition consecutive stones'''
+        if cell not in self.stones:
+            return False
+        # One more than win_condition tells exactly win_condition from longer runs
+        return any(self.count_line(cell, direction_index, self.win_condition + 1) == self.win_condition
+                   for direction_index in range(len(DIRECTIONS)))
+
+BACKENDS = {
+'array': ArrayBoard,
+'bitboard': BitBoard,
+'sparse': SparseBoard,
+}
@@ -0,0 +1,173 @@
+import numpy as np
+
+# Pattern weights. Score of a position is (black's patterns - white's patterns)
+FIVE = 1000000
+OPEN_FOUR = 100000      # Two or more cells complete five
+FOUR = 10000            # One cell completes five
+OPEN_THREE = 5000       # Two or more cells make an open four
+BROKEN_THREE = 1000     # One cell makes an open four (e.g. _X_XX_, or a three blocked on one side)
+# Windows of win_condition cells holding only one player's stones, by number of stones in them
+WINDOW = {1: 1, 2: 10, 3: 50}
+
+class PatternEvaluator():
+    '''Evaluates threat patterns of the board, kept up to date as stones are placed and removed.
+
+    Every row, column and diagonal that can hold win_condition stones is a line.
+    Each line is encoded as base 3 integer (0: empty, 1: stone 1, 2: stone -1),
+    updated in O(1) per stone, and its pattern score is cached by that code.
+    score > 0 favours stone 1.
+    cache_size: number of cached line scores. The cache is emptied when full,
+        so evaluators kept for many games (self-play workers, server engines) do not grow without bound'''
+    def __init__(self, board_size, win_condition, cache_size = 2**16):
+        self.board_size = board_size
+        self.win_condition = win_condition
+        self.cache_size = cache_size
+
+        # 1. Lines as tuples of cells
+        self.lines = list()
+        for d_row, d_column in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for row_index in range(board_size):
+                for column_index in range(board_size):
+                    # Only start lines on the first cell of each line
+                    previous_row, previous_column = row_index - d_row, column_index - d_column
+                    if 0 <= previous_row < board_size and 0 <= previous_column < board_size:
+                        continue
+                    line = list()
+                    scan_row, scan_column = row_index, column_index
+                    while 0 <= scan_row < board_size and 0 <= scan_column < board_size:
+                        line.append(scan_row * board_size + scan_column)
+                        scan_row, scan_column = scan_row + d_row, scan_column + d_column
+                    if len(line) >= win_condition:
+                        self.lines.append(tuple(line))
+        self.line_length = [len(line) for line in self.lines]
+
+        # 2. membership[cell]: (line index, place value of cell in line code) of every line through cell
+        membership = [list() for _ in range(board_size * board_size)]
+        for line_index, line in enumerate(self.lines):
+            for position, cell in enumerate(line):
+                membership[cell].append((line_index, 3 ** position))
+        self.membership = [tuple(entries) for entries in membership]
+
+        # {(length, code): score}
+        self.cache = dict()
+        self.reset()
+
+    def reset(self):
+        self.codes = [0] * len(self.lines)
+        self.line_scores = [0] * len(self.lines)
+        self.score = 0
+
+    def load(self, board):
+        '''Recompute all line scores for board array'''
+        self.reset()
+        board = np.asarray(board).flatten().tolist()
+        for cell, stone in enumerate(board):
+            if stone != 0:
+                self.place(cell, stone)
+
+    def place(self, cell, stone):
+        digit = 1 if stone == 1 else 2
+        for line_index, place_value in self.membership[cell]:
+            self.codes[line_index] += digit * place_value
+            self.update(line_index)
+
+    def remove(self, cell, stone):
+        digit = 1 if stone == 1 else 2
+        for line_index, place_value in self.membership[cell]:
+            self.codes[line_index] -= digit * place_value
+            self.update(line_index)
+
+    def update(self, line_index):
+        key = (self.line_length[line_index], self.codes[line_index])
+        line_score = self.cache.get(key)
+        if line_score is None:
+            line_score = self.score_line(*key)
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[key] = line_score
+        self.score += line_score - self.line_scores[line_index]
+        self.line_scores[line_index] = line_score
+
+    def evaluate(self, stone):
+        '''Score from the point of view of stone'''
+        return self.score if stone == 1 else -self.score
+
+    def score_line(self, length, code):
+        '''Pattern score of a line, given its length and base 3 code'''
+        line = list()
+        for _ in range(length):
+            code, digit = divmod(code, 3)
+            line.append((0, 1, -1)[digit])
+        return self.score_stone(line, 1) - self.score_stone(line, -1)
+
+    def score_stone(self, line, stone):
+        '''Pattern score of one player's stones in a line (list of stone codes)'''
+        w = self.win_condition
+        length = len(line)
+        score = 0
+
+        # 1. Windows of win_condition cells without opponent stones
+        for start in range(length - w + 1):
+            window = line[start:start + w]
+            if -stone not in window:
+                score += WINDOW.get(window.count(stone), 0)
+
+        # 2. Fives
+        run = 0
+        for i in range(length + 1):
+            if i < length and line[i] == stone:
+                run += 1
+            else:
+                if run == w:
+                    score += FIVE
+                run = 0
+
+        # 3. Fours: empty cells that complete five
+        wins = self.winning_cells(line, stone, range(length))
+        if len(wins) >= 2:
+            score += OPEN_FOUR
+        elif len(wins) == 1:
+            score += FOUR
+        # No threes counted if there is already a four
+        else:
+            # 4. Threes: empty cells that make two or more cells complete five
+            makes_open_four = 0
+            for i in range(length):
+                if line[i] != 0 or not self.near(line, i, stone):
+                    continue
+                line[i] = stone
+                if len(self.winning_cells(line, stone, range(max(0, i - w + 1), min(length, i + w)))) >= 2:
+                    makes_open_four += 1
+                line[i] = 0
+            if makes_open_four >= 2:
+                score += OPEN_THREE
+            elif makes_open_four == 1:
+                score += BROKEN_THREE
+        return score
+
+    def near(self, line, i, stone):
+        '''Whether stone is within win_condition - 1 cells of line[i]'''
+        w = self.win_condition
+        return stone in line[max(0, i - w + 1):i + w]
+
+    def winning_cells(self, line, stone, indices):
+        '''Empty cells among indices where stone would make exactly win_condition in a row'''
+        w = self.win_condition
+        length = len(line)
+        wins = list()
+        for i in indices:
+            if line[i] != 0:
+                continue
+            # Count consecutive stones through i
+            run = 1
+            j = i - 1
+            while j >= 0 and line[j] == stone:
+                run += 1
+                j -= 1
+            j = i + 1
+            while j < length and line[j] == stone:
+                run += 1
+                j += 1
+            if run == w:
+                wins.append(i)
+        return wins
@@ -1,34 +1,161 @@
+import collections
+import functools
 import numpy as np
-import pandas as pd
 import os
 import time
+import batch
+from board_backend import BACKENDS
+from player import Player, Players
+
+# Symmetry index giving back the cell moved by each symmetry (rotations by k: 4 - k, reflections: themselves)
+INVERSE_TRANSFORM = (0, 3, 2, 1, 4, 5, 6, 7)
+
+def row_label(index):
+    '''Name of row index: A, B, ..., Z, AA, AB, ... (like spreadsheet columns)'''
+    label = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
+
+def row_label_index(label):
+    '''Row index of name label (inverse of row_label)'''
+    index = 0
+    for char in label:
+        index = index * 26 + ord(char) - ord('A') + 1
+    return index - 1
+
+def column_label(index):
+    return str(index + 1)
+
+def column_label_index(label):
+    return int(label) - 1
+
+def zobrist_key(seed, index):
+    '''Random 63 bit key number index of seed (splitmix64), computed without a table'''
+    key = (seed * 0x9E3779B97F4A7C15 + (index + 1) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    key = (key ^ (key >> 31)) >> 1
+    return key if key != 0 else 1
+
+class Labels():
+    '''Names of the rows or columns of a board, as a read-only sequence computed on access
+    (so boards of any size have names, without a list of them)
+    name: function of index to name. index: function of name to index'''
+    def __init__(self, size, name, index):
+        self.size = size
+        self.name = name
+        self.name_index = index
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.name(i) for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('label index out of range')
+        return self.name(index)
+
+    def __iter__(self):
+        return (self.name(index) for index in range(self.size))
+
+    def __contains__(self, label):
+        try:
+            self.index(label)
+        except ValueError:
+            return False
+        return True
+
+    def index(self, label):
+        '''Index of name label. Raises ValueError if it is not a name of the board'''
+        try:
+            index = self.name_index(label)
+        except (ValueError, TypeError):
+            raise ValueError('%r is not a label'%(label,))
+        # Names have a single spelling (e.g. not '01' for '1')
+        if not 0 <= index < self.size or self.name(index) != label:
+            raise ValueError('%r is not a label'%(label,))
+        return index
+
+class CellTable():
+    '''Per cell table whose entries are computed by compute(cell) on first access,
+    for boards too large to build the table for every cell'''
+    def __init__(self, compute):
+        self.compute = compute
+        self.values = dict()
+
+    def __getitem__(self, cell):
+        value = self.values.get(cell)
+        if value is None:
+            value = self.values[cell] = self.compute(cell)
+        return value
 
 class Gomoku():
     '''Player Black(○) : 1
-    Player White(●) : -1'''
-    def __init__(self, board_size = 19, win_condition = 5):
-        self.player_info = pd.DataFrame(
-        {'stone_code': (1,-1),
-        'name': ('black', 'white')}
-        , index=[1,2]
-        )
-
-        self.num_player = len(self.player_info)
+    Player White(●) : -1
+
+    backend: how stones are stored, one of board_backend.BACKENDS
+        'array': flat list of stone codes (fastest for the agent's per move scans)
+        'bitboard': one Python int per stone, with shift-and-mask pattern detection
+        'sparse': dict of the stones, for large boards: per cell tables are computed lazily,
+            so memory and the cost of a move depend on the number of stones, not on board_size'''
+    def __init__(self, board_size = 19, win_condition = 5, candidate_distance = 1, zobrist_seed = 0, backend = 'array'):
+        self.players = Players((
+        Player(index = 1, stone_code = 1, name = 'black'),
+        Player(index = 2, stone_code = -1, name = 'white'),
+        ))
+
+        self.num_player = len(self.players)
         self.next_player_index = 0
         self.next_player = 1 # 1st player
 
-        # Initialize board
-        self.board_size = board_size
-        self.board = np.zeros((self.board_size,self.board_size), dtype = int)
+        # Game state, and the stack of pushed moves to undo them with pop()
+        self.done = False
+        self.winner = None
+        self.history = list()
 
         # Number of consecutive stones to win
         self.win_condition = win_condition
 
-        # row_info, column_info map "string" indices to its corresponding "integer" indices
-        self.row_info = { chr( ord('A') + x ) : x for x in range(self.board_size) }
-        self.column_info = {str(x+1) : x for x in range(self.board_size)}
-        self.row_names = list(self.row_info)
-        self.column_names = list(self.column_info)
+        self.board_size = board_size
+        # Stone storage. Cells are flat indices: row_index * board_size + column_index
+        self.backend = BACKENDS[backend](board_size, win_condition)
+        # Sparse boards compute the per cell tables below for the cells used only
+        self.sparse = backend == 'sparse'
+
+        # Candidate moves are empty cells within "candidate_distance" of any stone
+        self.candidate_distance = candidate_distance
+        self.neighborhood = self.build_neighborhood(candidate_distance)
+
+        # Zobrist keys: one random 63 bit key per (cell, stone), and one for the side to move
+        # zobrist_table[cell][0] for stone 1, [1] for stone -1
+        self.zobrist_seed = zobrist_seed
+        random_state = np.random.RandomState(zobrist_seed)
+        if self.sparse:
+            # Keys of sparse boards are computed from the cell (so they differ from the other backends' keys)
+            self.zobrist_table = CellTable(self.cell_zobrist)
+        else:
+            self.zobrist_table = random_state.randint(1, 2**63 - 1, size = (board_size * board_size, 2), dtype = np.int64).tolist()
+        self.zobrist_turn = int(random_state.randint(1, 2**63 - 1, dtype = np.int64))
+
+        # 8 symmetries of the board (rotations and reflections): symmetries[t][cell] is where cell moves to,
+        # and inverse_symmetries[t] moves it back. symmetries[0] is the identity
+        self.symmetries, self.inverse_symmetries = self.build_symmetries()
+        # symmetric_zobrist[cell][stone index]: keys of the stone moved by each of the 8 symmetries,
+        # packed in one int (64 bits per symmetry), so the 8 hashes are updated by a single xor
+        if self.sparse:
+            self.symmetric_zobrist = CellTable(self.cell_symmetric_zobrist)
+        else:
+            self.symmetric_zobrist = [self.cell_symmetric_zobrist(cell) for cell in range(board_size * board_size)]
+
+        # Names of rows (A, B, ..., Z, AA, ...) and columns (1, 2, ...)
+        self.row_names = Labels(board_size, row_label, row_label_index)
+        self.column_names = Labels(board_size, column_label, column_label_index)
         self.action_space = [self.row_names, self.column_names]
 
         # Search direction. Entries indicate slope of scan direction
@@ -46,20 +173,249 @@ class Gomoku():
         'inf': np.array([1,0]),
         }
 
+        # Cells on the 4 lines through each cell, up to win_condition - 1 cells away (cells that can share a five with it)
+        self.line_neighborhood = self.build_line_neighborhood()
+
+        # Optional incremental evaluation (see attach_evaluator)
+        self.evaluator = None
+        # Optional incremental 3*3 legality (see attach_legality)
+        self.legality = None
+
+        # Initialize board (also initializes the candidate frontier)
+        self.clear()
+
+    @property
+    def player_info(self):
+        '''Players as pandas DataFrame, for display'''
+        return self.players.to_dataframe()
+
+    @property
+    def board(self):
+        '''Copy of the board as (board_size, board_size) array. Assign to env.board to change it'''
+        return self.backend.to_array()
+
+    @board.setter
+    def board(self, board):
+        '''Assigning a new board rebuilds the incremental structures from it'''
+        self.backend.load(board)
+        self.history = list()
+        self.rebuild()
+
+    def build_neighborhood(self, distance):
+        '''Return list of [cells within "distance" of cell] for every cell (lazy CellTable for sparse boards)'''
+        if self.sparse:
+            return CellTable(functools.partial(self.cell_neighborhood, distance = distance))
+        return [self.cell_neighborhood(cell, distance) for cell in range(self.board_size * self.board_size)]
+
+    def cell_neighborhood(self, cell, distance):
+        '''Cells within "distance" of cell'''
+        row_index, column_index = divmod(cell, self.board_size)
+        cells = list()
+        for d_row in range(-distance, distance + 1):
+            for d_column in range(-distance, distance + 1):
+                scan_row, scan_column = row_index + d_row, column_index + d_column
+                if (d_row, d_column) != (0, 0) and 0 <= scan_row < self.board_size and 0 <= scan_column < self.board_size:
+                    cells.append(scan_row * self.board_size + scan_column)
+        return cells
+
+    def build_line_neighborhood(self):
+        '''Return list of [cells on the lines through cell, within win_condition - 1 of it] for every cell
+        (lazy CellTable for sparse boards)'''
+        if self.sparse:
+            return CellTable(self.cell_line_neighborhood)
+        return [self.cell_line_neighborhood(cell) for cell in range(self.board_size * self.board_size)]
+
+    def cell_line_neighborhood(self, cell):
+        '''Cells on the lines through cell, within win_condition - 1 of it'''
+        row_index, column_index = divmod(cell, self.board_size)
+        cells = list()
+        for direction in self.direction:
+            for step in (self.backward[direction], self.forward[direction]):
+                for k in range(1, self.win_condition):
+                    scan_row, scan_column = row_index + k * int(step[0]), column_index + k * int(step[1])
+                    if not (0 <= scan_row < self.board_size and 0 <= scan_column < self.board_size):
+                        break
+                    cells.append(scan_row * self.board_size + scan_column)
+        return cells
+
+    def cell_zobrist(self, cell):
+        '''Keys of stones 1, -1 on cell for sparse boards'''
+        return [zobrist_key(self.zobrist_seed, 2 * cell), zobrist_key(self.zobrist_seed, 2 * cell + 1)]
+
+    def cell_symmetric_zobrist(self, cell):
+        '''Keys of stones 1, -1 on cell moved by each of the 8 symmetries, packed in one int per stone'''
+        return [sum(self.zobrist_table[symmetry[cell]][stone_index] << (64 * t) for t, symmetry in enumerate(self.symmetries))
+                for stone_index in range(2)]
+
+    def symmetric_cell(self, cell, transform):
+        '''Cell moved by symmetry index transform, computed from its row and column (same as symmetries[transform][cell]):
+        transposed for transforms 4 ~ 7, then rotated counterclockwise by 90 degrees (transform % 4) times'''
+        last = self.board_size - 1
+        row_index, column_index = divmod(cell, self.board_size)
+        if transform >= 4:
+            row_index, column_index = column_index, row_index
+        rotation = transform % 4
+        if rotation == 1:
+            row_index, column_index = last - column_index, row_index
+        elif rotation == 2:
+            row_index, column_index = last - row_index, last - column_index
+        elif rotation == 3:
+            row_index, column_index = column_index, last - row_index
+        return row_index * self.board_size + column_index
+
+    def build_symmetries(self):
+        '''Return (symmetries, inverse_symmetries): 8 lists mapping every cell to its cell
+        in each rotation and reflection of the board, and the lists mapping them back
+        (lazy CellTables for sparse boards)'''
+        if self.sparse:
+            symmetries = [CellTable(functools.partial(self.symmetric_cell, transform = transform)) for transform in range(8)]
+            return symmetries, [symmetries[INVERSE_TRANSFORM[transform]] for transform in range(8)]
+        num_cells = self.board_size * self.board_size
+        cells = np.arange(num_cells).reshape(self.board_size, self.board_size)
+        symmetries, inverse_symmetries = list(), list()
+        for flip in (False, True):
+            for k in range(4):
+                # moved[r, c] is the cell moved to (r, c)
+                moved = np.rot90(cells.T if flip else cells, k).flatten()
+                symmetry = np.empty(num_cells, dtype = int)
+                symmetry[moved] = np.arange(num_cells)
+                symmetries.append(symmetry.tolist())
+                inverse_symmetries.append(moved.tolist())
+        return symmetries, inverse_symmetries
+
+    def attach_evaluator(self, evaluator):
+        '''Keep evaluator (e.g. evaluation.PatternEvaluator) updated on every stone placed and removed'''
+        self.evaluator = evaluator
+        self.evaluator.load(self.backend.to_array())
+
+    def attach_legality(self, legality):
+        '''Keep legality (legality.LegalityMask) updated on every stone placed and removed.
+        move() then looks legality up instead of simulating the stone, and actions() leaves out illegal cells'''
+        self.legality = legality
+        self.legality.load(self.backend.to_array())
+
+    def rebuild(self):
+        '''Recompute the candidate frontier and hash from scratch for the current board'''
+        if self.sparse:
+            # 1. Number of stones within candidate_distance of the cells near stones, counted from the stones
+            stones = list(self.backend.stones.items())
+            self.neighbor_count = collections.defaultdict(int)
+            for cell, _ in stones:
+                for neighbor in self.neighborhood[cell]:
+                    self.neighbor_count[neighbor] += 1
+            self.num_stones = len(stones)
+        else:
+            board = self.backend.to_array()
+            # 1. Number of stones within candidate_distance of every cell
+            occupied = (board != 0).astype(int)
+            distance = self.candidate_distance
+            padded = np.pad(occupied, distance)
+            neighbor_count = np.zeros_like(occupied)
+            for d_row in range(-distance, distance + 1):
+                for d_column in range(-distance, distance + 1):
+                    if (d_row, d_column) != (0, 0):
+                        neighbor_count += padded[distance + d_row : distance + d_row + self.board_size,
+                                                 distance + d_column : distance + d_column + self.board_size]
+            # Plain lists are much faster than numpy for single element access
+            self.neighbor_count = neighbor_count.flatten().tolist()
+            self.num_stones = int(occupied.sum())
+            stones = [(cell, stone) for cell, stone in enumerate(board.flatten().tolist()) if stone != 0]
+
+        # 2. Zobrist hash of the stones and the side to move
+        self.hash = self.zobrist_turn if self.next_player_index % 2 else 0
+        for cell, stone in stones:
+            self.hash ^= self.zobrist_table[cell][(1 - stone) // 2]
+        # Zobrist hashes of the stones moved by each symmetry (without the side to move), packed like symmetric_zobrist
+        self.symmetric_hash = 0
+        for cell, stone in stones:
+            self.symmetric_hash ^= self.symmetric_zobrist[cell][(1 - stone) // 2]
+
+        # 3. Empty cells with at least one stone nearby
+        if self.sparse:
+            self.frontier = {cell for cell in self.neighbor_count if self.backend.get(cell) == 0}
+        else:
+            self.frontier = set(np.flatnonzero((neighbor_count > 0) & (occupied == 0)).tolist())
+
+        # 4. Evaluation and legality
+        if self.evaluator is not None:
+            self.evaluator.load(self.backend.to_array())
+        if self.legality is not None:
+            self.legality.load(self.backend.to_array())
+
+    def place_stone(self, cell, stone):
+        '''Put stone on flat index cell and update the candidate frontier'''
+        self.backend.place(cell, stone)
+        self.num_stones += 1
+        self.hash ^= self.zobrist_table[cell][(1 - stone) // 2]
+        self.symmetric_hash ^= self.symmetric_zobrist[cell][(1 - stone) // 2]
+        if self.evaluator is not None:
+            self.evaluator.place(cell, stone)
+        if self.legality is not None:
+            self.legality.place(cell, stone)
+        self.frontier.discard(cell)
+        for neighbor in self.neighborhood[cell]:
+            self.neighbor_count[neighbor] += 1
+            if self.backend.get(neighbor) == 0:
+                self.frontier.add(neighbor)
+
+    def remove_stone(self, cell):
+        '''Take back stone placed by place_stone(), restoring the candidate frontier'''
+        stone = self.backend.get(cell)
+        self.hash ^= self.zobrist_table[cell][(1 - stone) // 2]
+        self.symmetric_hash ^= self.symmetric_zobrist[cell][(1 - stone) // 2]
+        self.backend.remove(cell)
+        if self.evaluator is not None:
+            self.evaluator.remove(cell, stone)
+        if self.legality is not None:
+            self.legality.remove(cell)
+        self.num_stones -= 1
+        for neighbor in self.neighborhood[cell]:
+            self.neighbor_count[neighbor] -= 1
+            if self.neighbor_count[neighbor] == 0:
+                self.frontier.discard(neighbor)
+        if self.neighbor_count[cell] > 0:
+            self.frontier.add(cell)
+
+    def set_turn(self, player_index):
+        '''Make player_index the side to move (before assigning the board, whose hash includes the side to move)'''
+        self.next_player_index = self.players.index.index(player_index)
+        self.next_player = player_index
+
+    def clear(self):
+        '''Remove all stones (sparse boards do it without allocating a board)'''
+        if self.sparse:
+            self.backend.clear()
+            self.history = list()
+            self.rebuild()
+        else:
+            self.board = np.zeros((self.board_size,self.board_size), dtype = int)
+
     def reset(self):
-        self.board = np.zeros((self.board_size,self.board_size))
+        # Black moves first (set before the board, whose hash includes the side to move)
+        self.next_player_index = 0
+        self.next_player = self.players.index[0]
+        self.clear()
+        self.done = False
+        self.winner = None
 
     def show(self, board = None):
-        '''Show contents in board'''
+        '''Show contents in board (sparse boards show the part around their stones)'''
         # 1. Current board
         if type(board) == type(None):
+            # Sparse boards: bounding box of the stones, with a margin of 2 cells
+            if self.sparse:
+                board, first_row, first_column = self.backend.crop(margin = 2)
+                row_names = self.row_names[first_row : first_row + board.shape[0]]
+                column_names = self.column_names[first_column : first_column + board.shape[1]]
+            else:
+                board, row_names, column_names = self.board, self.row_names, self.column_names
             # 1. Print Column names
             print('{:<3}'.format(''),end='')
-            for column_name in self.column_names:
+            for column_name in column_names:
                 print('{:<3}'.format(column_name), end='')
             print('\n', end='')
 
-            for row, row_name in zip(self.board, self.row_names):
+            for row, row_name in zip(board, row_names):
                 print('{:<3}'.format(row_name), end='')
                 for column in row:
                     if column == 0:
@@ -93,85 +449,138 @@ class Gomoku():
                         assert False, 'wrong data in board'
                 print('\n', end='')
 
-    def step(self, stone_loc, player_index):
-        self.move(stone_loc, player_index)
-        done, winner = self.terminal_test(stone_loc)
+    def step(self, cell, player_index):
+        self.move(cell, player_index)
+        done, winner = self.terminal_test(cell)
+        self.done, self.winner = done, winner
         return self.board, winner, done, None
 
-    def move(self, stone_loc, player_index):
+    def push(self, cell, player_index = None):
+        '''Make a move that can be taken back with pop(). Returns (winner, done)'''
+        if player_index is None:
+            player_index = self.next_player
+        # Remember everything move() and terminal_test() change
+        undo_info = (self.next_player_index, self.next_player, self.done, self.winner)
+        placed = self.move(cell, player_index)
+        self.history.append((placed, undo_info))
+
+        self.done, self.winner = self.terminal_test(cell)
+        return self.winner, self.done
+
+    def pop(self):
+        '''Unmake the last move made by push()'''
+        cell, undo_info = self.history.pop()
+        # Illegal moves did not place a stone
+        if cell is not None:
+            self.remove_stone(cell)
+        self.next_player_index, self.next_player, self.done, self.winner = undo_info
+        self.hash ^= self.zobrist_turn
+
+    def canonical_key(self):
+        '''Return (key, transform): the smallest Zobrist hash of the stones among the 8 symmetric positions,
+        and the index of the symmetry giving it (the lowest one, for symmetric positions).
+        Positions which are rotations or reflections of each other have the same key.
+        Like self.hash, but without the side to move'''
+        hashes = self.symmetric_hashes()
+        key = min(hashes)
+        return key, hashes.index(key)
+
+    def symmetric_hashes(self):
+        '''Zobrist hashes of the stones moved by each of the 8 symmetries'''
+        return [(self.symmetric_hash >> (64 * t)) & 0xFFFFFFFFFFFFFFFF for t in range(len(self.symmetries))]
+
+    def transform_cell(self, cell, transform):
+        '''Map cell of the position to the canonical position of canonical_key() (transform: its symmetry index)'''
+        return self.symmetries[transform][cell]
+
+    def inverse_transform_cell(self, cell, transform):
+        '''Map cell of the canonical position back to the position'''
+        return self.inverse_symmetries[transform][cell]
+
+    def transform_board(self, board, transform):
+        '''Return board (board_size, board_size) moved by symmetry index transform (e.g. to canonicalize or augment data)'''
+        board = np.asarray(board).flatten()
+        transformed = np.empty_like(board)
+        symmetry = self.symmetries[transform]
+        if self.sparse:
+            symmetry = [symmetry[cell] for cell in range(len(board))]
+        transformed[symmetry] = board
+        return transformed.reshape(self.board_size, self.board_size)
+
+    def to_cell(self, stone_loc):
+        '''Convert (row, column) names such as ('A', '1') to flat index cell'''
         row, column = stone_loc
-        row_index = self.row_info[row]
-        column_index = self.column_info[column]
-        stone_loc_index = (row_index, column_index)
-        stone = self.player_info.loc[player_index]['stone_code']
+        return self.row_names.index(row) * self.board_size + self.column_names.index(column)
 
-        if self.is_illegal(stone_loc_index, stone):
-            pass
+    def to_stone_loc(self, cell):
+        '''Convert flat index cell to (row, column) names such as ('A', '1')'''
+        row_index, column_index = divmod(cell, self.board_size)
+        return (self.row_names[row_index], self.column_names[column_index])
+
+    def move(self, cell, player_index):
+        '''Place stone on flat index cell (row_index * board_size + column_index) and pass the turn.
+        Returns cell, or None if the move was illegal'''
+        stone = self.players.stone_code[player_index]
+
+        illegal = self.legality.is_illegal(cell, stone) if self.legality is not None else self.is_illegal(cell, stone)
+        if illegal:
+            cell = None
             # print('Illegal Move!! Your turn has passed...')
         else:
-            self.board[stone_loc_index] = stone
+            self.place_stone(cell, stone)
 
         self.next_player_index = (self.next_player_index + 1) % self.num_player
-        self.next_player = self.player_info.index[self.next_player_index]
+        self.next_player = self.players.index[self.next_player_index]
+        self.hash ^= self.zobrist_turn
+        return cell
 
     def actions(self, board = None):
-        '''Return list of tuple[(x1,y1),(x2,y2),...] actions indicating locations where there are adjacent stones'''
-        # 1. Board to search
-        if type(board) == type(None):
-            board = self.board
-        # 2. If board is empty
+        '''Return list of cells [c1, c2, ...] indicating locations where there are adjacent stones'''
+        # 1. Current board - read the incrementally maintained frontier
+        if board is None:
+            # If board is empty
+            if self.num_stones == 0:
+                # Sparse boards start at the center, instead of listing every cell
+                if self.sparse:
+                    return [(self.board_size // 2) * self.board_size + self.board_size // 2]
+                return self.all_actions()
+            # Without cells illegal for the next player, if legality is attached
+            if self.legality is not None:
+                return sorted(self.frontier - self.legality.illegal_cells(self.players.stone_code[self.next_player]))
+            return sorted(self.frontier)
+
+        # 2. Other board - scan it
+        # If board is empty
         if (board==0).all() == True:
-            return self.all_actions()
-
-        actions = list()
-        # 3. Search for all stone locations, for places which adjacent stones exist
-        for row_index in range(self.board_size):
-            for column_index in range(self.board_size):
-                # 1] If there is no stone here
-                stone_loc_index = np.asarray([row_index, column_index])
-                if board[tuple(stone_loc_index)] == 0:
-                    # 1) Search all adjacent 8 directions
-                    for search_direction in list(self.forward.values()) + list(self.backward.values()):
-                        scan_loc = stone_loc_index + search_direction
-                        # If the scan location is inside the board, check if there's a stone
-                        if ((0<=scan_loc).all() and (scan_loc<=self.board_size-1).all()):
-                            # If there's stone on the scan location, append action
-                            if board[tuple(scan_loc)] != 0:
-                                actions.append( (self.row_names[row_index], self.column_names[column_index]) )
-                                break
-
-        return actions
+            return self.all_actions(board)
+
+        # Shift the occupied cells in every direction within candidate_distance
+        occupied = board != 0
+        distance = self.candidate_distance
+        padded = np.pad(occupied, distance)
+        near_stone = np.zeros_like(occupied)
+        for d_row in range(-distance, distance + 1):
+            for d_column in range(-distance, distance + 1):
+                near_stone |= padded[distance + d_row : distance + d_row + self.board_size,
+                                     distance + d_column : distance + d_column + self.board_size]
+        return np.flatnonzero(near_stone & ~occupied).tolist()
 
     def all_actions(self, board = None):
-        '''Return list of tuple[(x1,y1),(x2,y2),...] actions indicating all possible locations'''
+        '''Return list of cells [c1, c2, ...] indicating all possible locations'''
         # 1. Current board
         if type(board) == type(None):
             board = self.board
 
         # 2. Search for all places without stone
-        actions_row, actions_column = np.where(board == 0)
-        actions = list()
-        for row_index, column_index in zip(actions_row, actions_column):
-            actions.append( (self.row_names[row_index], self.column_names[column_index]) )
-        return actions
+        return np.flatnonzero(board == 0).tolist()
 
-    def terminal_test(self, stone_loc):
-        row, column = stone_loc
-        row_index = self.row_info[row]
-        column_index = self.column_info[column]
-        stone_loc_index = (row_index, column_index)
+    def terminal_test(self, cell):
         # 1. When there are "win_condition" stones
-        for i, direction in enumerate(self.direction):
-            counted_stones = self.count_consecutive_stones(stone_loc_index, direction, max_stones = self.win_condition + 1)
-
-            # If counted stones meets win condition
-            if counted_stones == self.win_condition:
-                stone = self.board[stone_loc_index]
-                # Search player index that matches stone code
-                return True, self.player_info.index[self.player_info['stone_code']==stone][0]
+        if self.backend.is_win(cell):
+            return True, self.players.stone_to_player[self.backend.get(cell)]
 
         # 2. If the board is full but there is no winner
-        if (self.board != 0).all() :
+        if self.num_stones == self.board_size * self.board_size:
             return True, None
         # 3. Game hasn't ended yet
         return False, None
@@ -179,92 +588,82 @@ class Gomoku():
     def terminal_test_all(self):
         '''For every stone, perform terminal_test'''
         # 1. Scan search space (stone location)
-        search_space_row, search_space_column = np.where(self.board != 0)
-        search_space_row = np.asarray(self.row_names)[search_space_row]
-        search_space_column = np.asarray(self.column_names)[search_space_column]
+        search_space = sorted(self.backend.stone_cells(1) + self.backend.stone_cells(-1))
 
         # 2. For each move in the search space, check for moves [right, right-down, down]
-        for row, column in zip(search_space_row, search_space_column):
-            done, winner = self.terminal_test((row,column))
+        for cell in search_space:
+            done, winner = self.terminal_test(cell)
             if done == True:
                 return True, winner
 
         # 3. If the board is full but there is no winner
-        if (self.board != 0).all() :
+        if self.num_stones == self.board_size * self.board_size:
             return True, None
 
         # 4. Game hasn't ended yet
         return False, None
 
-    def count_consecutive_stones(self, stone_loc_index, direction, max_stones = 6):
-        stone_loc_index = np.asarray(stone_loc_index)
-        stone = self.board[stone_loc_index[0], stone_loc_index[1]]
-        # If no stone present
-        if stone == 0:
-            return 0
-        # 1. Backward search
-        stone_count = 1
-        scan_loc = stone_loc_index + self.backward[direction]
-
-        # While scan location is inside the boundaries
-        while( (0<=scan_loc).all() and (scan_loc<=self.board_size-1).all() ):
-            stone_scanned = self.board[scan_loc[0], scan_loc[1]]
-
-            # Same stone found
-            if stone_scanned == stone:
-                stone_count += 1
-            else:
-                break
-
-            # If enough stone is found, return
-            if stone_count >= max_stones:
-                return stone_count
-
-            # Move scan
-            scan_loc += self.backward[direction]
-
-        # 2. Forward search
-        scan_loc = stone_loc_index + self.forward[direction]
-
-        # While scan location is inside the boundaries
-        while( (0<=scan_loc).all() and (scan_loc<=self.board_size-1).all() ):
-            stone_scanned = self.board[scan_loc[0], scan_loc[1]]
-
-            # Same stone found
-            if stone_scanned == stone:
-                stone_count += 1
-            else:
-                break
-
-            # If enough stone is found, return
-            if stone_count >= max_stones:
-                return stone_count
-
-            # Move scan
-            scan_loc += self.forward[direction]
-
-        return stone_count
-
-    def is_illegal(self, stone_loc_index, stone):
-        row_index, column_index = stone_loc_index
+    def is_winning_move(self, cell, player_index):
+        '''Whether player_index would win by playing on empty cell (a legal move making exactly win_condition in a row)'''
+        stone = self.players.stone_code[player_index]
+        self.backend.place(cell, stone)
+        win = self.backend.is_win(cell)
+        self.backend.remove(cell)
+        # Legality is checked last, since most cells do not win
+        return win and not self.is_illegal(cell, stone)
+
+    def winning_moves(self, player_index, cells = None):
+        '''Return list of cells where player_index would win.
+        Only cells sharing a line with player's stones are checked, unless cells are given'''
+        if cells is None:
+            cells = set()
+            for stone_cell in self.backend.stone_cells(self.players.stone_code[player_index]):
+                cells.update(self.line_neighborhood[stone_cell])
+            cells = sorted(cells)
+        return [cell for cell in cells if self.backend.get(cell) == 0 and self.is_winning_move(cell, player_index)]
+
+    def batch_actions_mask(self, boards, legal = True):
+        '''Candidate moves of a stack of boards (B, board_size, board_size), as bool array of the same shape.
+        legal: exclude cells illegal (3*3) for the side to move of each board'''
+        if legal:
+            return batch.legal_candidate_mask(boards, self.candidate_distance)
+        return batch.candidate_mask(boards, self.candidate_distance)
+
+    def batch_terminal_test(self, boards):
+        '''terminal_test() of a stack of boards. Returns (done, winner): bool array (B,),
+        and int array (B,) of winner's player index (0 if no winner)'''
+        done, winner_stone = batch.terminal_test(boards, self.win_condition)
+        winner = np.zeros(len(winner_stone), dtype = int)
+        for player in self.players:
+            winner[winner_stone == player.stone_code] = player.index
+        return done, winner
+
+    def batch_pattern_counts(self, boards):
+        '''Threat pattern counts of a stack of boards: {name: int array (B, 2)}, columns for stones (1, -1)'''
+        return batch.pattern_counts(boards, self.win_condition)
+
+    def count_consecutive_stones(self, cell, direction, max_stones = 6):
+        return self.backend.count_line(cell, self.direction.index(direction), max_stones)
+
+    def is_illegal(self, cell, stone):
+        '''Whether stone cannot be placed on cell: occupied, or 3*3.
+        Checks the backend directly, so it also holds while stones are temporarily placed on it'''
         # 1. Stone already exists
-        if self.board[row_index, column_index] != 0:
+        if self.backend.get(cell) != 0:
             return True
 
         # 2. 3*3
         # Temporarily place stone
-        self.board[stone_loc_index] = stone
-        counted_stones = np.zeros_like(self.direction, dtype=int)
-        for i, direction in enumerate(self.direction):
-            counted_stones[i] = self.count_consecutive_stones(stone_loc_index, direction, max_stones = 4)
+        self.backend.place(cell, stone)
+        counted_stones = [self.backend.count_line(cell, i, 4) for i in range(len(self.direction))]
         # Remove stone
-        self.board[stone_loc_index] = 0
+        self.backend.remove(cell)
         # If exactly 2 cases of 3 consecutive stones happen, it's illegal
-        if sum(counted_stones==3) == 2:
+        if counted_stones.count(3) == 2:
             return True
 
         return False
-        
+
 # print(self.count_consecutive_stones((9,1), 'inf'))
 # self = Gomoku()
 # self.all_actions()
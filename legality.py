@@ -0,0 +1,141 @@
+import numpy as np
+import batch
+
+# Direction masks with exactly two bits set: two lines of exactly 3 stones make a move illegal
+DOUBLE_THREES = frozenset(mask for mask in range(16) if bin(mask).count('1') == 2)
+
+class LegalityMask():
+    '''Cells where a stone would be illegal by the 3*3 rule of Gomoku.is_illegal,
+    kept up to date as stones are placed and removed.
+
+    The whole board is computed at once with batch.three_directions() on load.
+    For every empty cell and stone, threes[stone index][cell] has bit i set when placing the stone
+    makes exactly 3 consecutive stones along batch.LINE_DIRECTIONS[i].
+    Placing or removing a stone only changes the runs of its own colour, so only the first
+    empty cell past its own stones on each of the 8 rays from it (at most 3 cells away) is updated.
+    Updates are applied when legality is looked up, so a stone placed and removed in between
+    (e.g. leaves of a search) costs nothing.'''
+    def __init__(self, board_size):
+        self.board_size = board_size
+
+        # line_table[cell][i] = (backward cells, forward cells) along LINE_DIRECTIONS[i], up to 3 cells each
+        self.line_table = list()
+        for row_index in range(board_size):
+            for column_index in range(board_size):
+                lines = list()
+                for d_row, d_column in batch.LINE_DIRECTIONS:
+                    scans = list()
+                    for sign in (-1, 1):
+                        cells = list()
+                        for k in range(1, 4):
+                            scan_row, scan_column = row_index + sign * k * d_row, column_index + sign * k * d_column
+                            if not (0 <= scan_row < board_size and 0 <= scan_column < board_size):
+                                break
+                            cells.append(scan_row * board_size + scan_column)
+                        scans.append(tuple(cells))
+                    lines.append(tuple(scans))
+                self.line_table.append(tuple(lines))
+        self.reset()
+
+    def reset(self):
+        num_cells = self.board_size * self.board_size
+        self.cells = [0] * num_cells
+        # [0] for stone 1, [1] for stone -1
+        self.threes = [[0] * num_cells, [0] * num_cells]
+        self.illegal = [set(), set()]
+        # Stones placed (cell, stone) and removed (cell, 0) since the last lookup
+        self.pending = list()
+
+    def load(self, board):
+        '''Recompute the whole board at once'''
+        board = np.asarray(board)
+        self.cells = board.flatten().tolist()
+        self.pending = list()
+        for stone_index, stone in enumerate(batch.STONES):
+            threes = batch.three_directions(board, stone)[0]
+            self.threes[stone_index] = threes.flatten().tolist()
+            self.illegal[stone_index] = set(np.flatnonzero(batch.double_three_mask(board, stone)[0]).tolist())
+
+    def is_illegal(self, cell, stone):
+        '''Whether stone cannot be placed on cell (occupied, or 3*3)'''
+        if self.pending:
+            self.flush()
+        return self.cells[cell] != 0 or cell in self.illegal[(1 - stone) // 2]
+
+    def illegal_cells(self, stone):
+        '''Set of empty cells illegal for stone'''
+        if self.pending:
+            self.flush()
+        return self.illegal[(1 - stone) // 2]
+
+    def illegal_mask(self, stone):
+        '''Illegal empty cells for stone as bool array (board_size, board_size)'''
+        mask = np.zeros(self.board_size * self.board_size, dtype = bool)
+        mask[list(self.illegal_cells(stone))] = True
+        return mask.reshape(self.board_size, self.board_size)
+
+    def place(self, cell, stone):
+        self.pending.append((cell, stone))
+
+    def remove(self, cell):
+        # Removing the stone placed last cancels it
+        if self.pending and self.pending[-1][0] == cell and self.pending[-1][1] != 0:
+            self.pending.pop()
+        else:
+            self.pending.append((cell, 0))
+
+    def flush(self):
+        '''Apply pending placements and removals in order'''
+        for cell, stone in self.pending:
+            if stone != 0:
+                self.apply_place(cell, stone)
+            else:
+                self.apply_remove(cell)
+        self.pending = list()
+
+    def apply_place(self, cell, stone):
+        self.cells[cell] = stone
+        self.illegal[0].discard(cell)
+        self.illegal[1].discard(cell)
+        self.update_rays(cell, stone)
+
+    def apply_remove(self, cell):
+        '''Take back the last stone placed around cell (moves are undone in reverse order, as by Gomoku.pop()).
+        The lines through cell are then the same as when the stone was placed, and bits of occupied cells
+        are never updated, so the bits of cell are still valid'''
+        stone = self.cells[cell]
+        self.cells[cell] = 0
+        self.update_rays(cell, stone)
+        for stone_index in range(2):
+            if self.threes[stone_index][cell] in DOUBLE_THREES:
+                self.illegal[stone_index].add(cell)
+
+    def update_rays(self, cell, stone):
+        '''Update the cells whose runs of stone along a line reach cell'''
+        cells = self.cells
+        line_table = self.line_table
+        stone_index = (1 - stone) // 2
+        threes = self.threes[stone_index]
+        illegal = self.illegal[stone_index]
+        for direction_index, rays in enumerate(line_table[cell]):
+            bit = 1 << direction_index
+            for ray in rays:
+                for scan_cell in ray:
+                    scan_stone = cells[scan_cell]
+                    if scan_stone == stone:
+                        continue
+                    # First empty cell past the stones: recount its line along this direction
+                    if scan_stone == 0:
+                        stone_count = 1
+                        for line_cells in line_table[scan_cell][direction_index]:
+                            for line_cell in line_cells:
+                                if cells[line_cell] != stone:
+                                    break
+                                stone_count += 1
+                        mask = threes[scan_cell] | bit if stone_count == 3 else threes[scan_cell] & ~bit
+                        threes[scan_cell] = mask
+                        if mask in DOUBLE_THREES:
+                            illegal.add(scan_cell)
+                        else:
+                            illegal.discard(scan_cell)
+                    break
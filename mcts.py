@@ -0,0 +1,449 @@
+import math
+import multiprocessing
+import os
+import random
+import time
+import numpy as np
+from gomoku import Gomoku
+from legality import LegalityMask
+from threat_search import ThreatSpaceSearch
+from opening_book import OpeningBook
+
+# State of each rollout worker process, set by init_worker()
+worker = dict()
+
+def policy_move(env, player_index, last_moves, rng):
+    '''Cheap pattern policy of rollouts, for player_index to move.
+    last_moves: [player's last move, opponent's last move] (None if unknown)
+        1. Win on the lines of the player's last stone
+        2. Block the opponent's win on the lines of its last stone
+        3. Random legal cell next to either last stone
+        4. Random legal cell of the frontier
+    Returns cell, or None if there is no legal move'''
+    opponent_index = env.players.other(player_index)
+    stone = env.players.stone_code[player_index]
+    own_last, opponent_last = last_moves
+    # 1, 2. Wins and blocks
+    if own_last is not None:
+        wins = env.winning_moves(player_index, env.line_neighborhood[own_last])
+        if len(wins) > 0:
+            return wins[0]
+    if opponent_last is not None:
+        blocks = env.winning_moves(opponent_index, env.line_neighborhood[opponent_last])
+        blocks = [cell for cell in blocks if not env.legality.is_illegal(cell, stone)]
+        if len(blocks) > 0:
+            return blocks[0]
+    # 3. Local reply
+    local = list()
+    for last in last_moves:
+        if last is not None:
+            local.extend(cell for cell in env.neighborhood[last] if not env.legality.is_illegal(cell, stone))
+    if len(local) > 0:
+        return rng.choice(local)
+    # 4. Anywhere near the stones
+    frontier = [cell for cell in env.frontier if not env.legality.is_illegal(cell, stone)]
+    if len(frontier) > 0:
+        return rng.choice(frontier)
+    return None
+
+def rollout(env, player_index, last_moves, max_moves, rng):
+    '''Play policy_move() for both players from the position of env, with player_index to move,
+    and undo the moves. Returns the winner's player index, or None for a tie
+    (including games not decided within max_moves)'''
+    winner = None
+    last_moves = list(last_moves)
+    num_moves = 0
+    while num_moves < max_moves:
+        cell = policy_move(env, player_index, last_moves, rng)
+        if cell is None:
+            break
+        winner, done = env.push(cell, player_index)
+        num_moves += 1
+        if done:
+            break
+        player_index = env.players.other(player_index)
+        # The player to move next: its last move is the opponent's last move before it
+        last_moves = [last_moves[1], cell]
+    for _ in range(num_moves):
+        env.pop()
+    return winner
+
+def init_worker(env_kwargs, seed):
+    '''Create the worker's own environment once'''
+    env = Gomoku(**env_kwargs)
+    env.attach_legality(LegalityMask(env.board_size))
+    worker['env'] = env
+    worker['rng'] = random.Random(seed + os.getpid())
+
+def rollout_task(task):
+    '''rollout() in a worker process. task: (board, player_index, last_moves, max_moves)'''
+    board, player_index, last_moves, max_moves = task
+    env = worker['env']
+    env.set_turn(player_index)
+    env.board = board
+    return rollout(env, player_index, last_moves, max_moves, worker['rng'])
+
+class NodePool():
+    '''Nodes of the search tree in preallocated arrays (lists), one slot per node instead of one object per node.
+    Children of a node are allocated together, in slots first_child[node] ... first_child[node] + num_children[node] - 1.
+
+    move: cell played to reach the node
+    player: player index who played it
+    visits, wins: number of simulations through the node, and their results for player (1 win, 0.5 tie)
+    winner: player index if the move ended the game with a win, TIE for a tie, NOT_TERMINAL otherwise
+    '''
+    NOT_TERMINAL = -1
+    TIE = 0
+    FIELDS = ('move', 'player', 'parent', 'first_child', 'num_children', 'visits', 'wins', 'winner')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        for field in self.FIELDS:
+            setattr(self, field, [0] * capacity)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.size = 0
+
+    def allocate(self, count):
+        '''Return the first of count new consecutive slots, or None if the pool is full'''
+        if self.size + count > self.capacity:
+            return None
+        first = self.size
+        self.size += count
+        return first
+
+    def init(self, node, move, player, parent):
+        self.move[node] = move
+        self.player[node] = player
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.num_children[node] = 0
+        self.visits[node] = 0
+        self.wins[node] = 0.0
+        self.winner[node] = self.NOT_TERMINAL
+
+    def child(self, node, move):
+        '''Child of node reached by move, or None'''
+        first = self.first_child[node]
+        for child in range(first, first + self.num_children[node]):
+            if self.move[child] == move:
+                return child
+        return None
+
+    def compact(self, root):
+        '''Keep only the subtree of root, moved to the start of the pool (root becomes node 0)'''
+        # Breadth first order keeps the children of every node together
+        order = [root]
+        parents = [-1]
+        first_children = list()
+        index = 0
+        while index < len(order):
+            node = order[index]
+            num_children = self.num_children[node]
+            first_children.append(len(order) if num_children > 0 else -1)
+            first = self.first_child[node]
+            order.extend(range(first, first + num_children))
+            parents.extend([index] * num_children)
+            index += 1
+
+        size = len(order)
+        for field in ('move', 'player', 'num_children', 'visits', 'wins', 'winner'):
+            values = getattr(self, field)
+            values[:size] = [values[node] for node in order]
+        self.parent[:size] = parents
+        self.first_child[:size] = first_children
+        self.size = size
+        return 0
+
+class Monte_Carlo_Tree_Search():
+    '''
+    Monte Carlo tree search with UCT selection, an alternative to agent.Iterative_Deepening_Alpha_Beta
+    created the same way (env, player_index), with the same search(state, deadline, max_nodes) interface.
+
+    Every simulation selects moves from the root by UCT, expands the reached leaf with all its legal moves,
+    and plays a rollout with the cheap pattern policy of policy_move(). The move with most simulations is played.
+    When a player can win at once, only the winning move is expanded, and when the opponent can,
+    only the blocks are, so forced moves are not diluted by the rest of the board.
+    The tree is kept between moves: the next search starts from the subtree of the moves played.
+
+    pool_size: maximum number of nodes of the tree (see NodePool). When it is full, leaves are no longer expanded
+    exploration: constant of the UCT exploration term
+    simulations: number of simulations of search() without deadline or max_nodes
+    rollout_moves: maximum number of moves per rollout. Undecided rollouts count as ties
+    num_workers: number of rollout worker processes. With more than one, batches of num_workers leaves
+        are selected (each one counted as a loss until its result is known, so the batch spreads out)
+        and rolled out in parallel
+    threat_search: 'vcf', 'vct' or None. Mode of threat_search.ThreatSpaceSearch run before the tree search
+    opening_book: path of a book built by opening_book.py, or None
+    verbose: whether to print progress of the search
+    seed: seed of the rollouts
+    '''
+    def __init__(self, env, player_index = None, pool_size = 2**18, exploration = 1.4, simulations = 1000, rollout_moves = 60,
+                 num_workers = 1, threat_search = 'vcf', opening_book = None, verbose = True, seed = 0):
+        self.env = env
+        self.player_index = player_index
+        self.opponent_index = self.env.players.other(player_index)
+        self.action = None
+        self.exploration = exploration
+        self.simulations = simulations
+        self.rollout_moves = rollout_moves
+        self.verbose = verbose
+        # threading.Event which stops the search like the deadline when set (see ponder.Ponderer)
+        self.stop_event = None
+        self.rng = random.Random(seed)
+        # Incremental 3*3 legality, so illegal moves are never expanded or played in rollouts
+        self.env.attach_legality(LegalityMask(self.env.board_size))
+
+        self.threat_search = ThreatSpaceSearch(self.env, mode = threat_search) if threat_search is not None else None
+        self.opening_book = OpeningBook(opening_book) if opening_book is not None else None
+
+        # Search tree, and the root position of the last search (to reuse the tree on the next move)
+        self.pool = NodePool(pool_size)
+        self.root = None
+        self.root_board = None
+        # Number of simulations of the last search, and most visited line from the root
+        self.nodes = 0
+        self.pv = list()
+
+        # Rollout worker processes
+        self.num_workers = num_workers
+        self.workers = None
+        if num_workers > 1:
+            env_kwargs = {'board_size': env.board_size, 'win_condition': env.win_condition, 'candidate_distance': env.candidate_distance}
+            self.workers = multiprocessing.Pool(num_workers, initializer = init_worker, initargs = (env_kwargs, seed))
+
+    def close(self):
+        if self.workers is not None:
+            self.workers.terminate()
+            self.workers.join()
+
+    def search(self, state, deadline = None, max_nodes = None):
+        '''
+        Return the move with most simulations from state.
+
+        deadline: time.time() value to stop at, or None
+        max_nodes: number of simulations, or None.
+        Without both, self.simulations simulations are run
+        '''
+        self.action = None
+        self.nodes = 0
+        self.pv = list()
+        if deadline is None and max_nodes is None:
+            max_nodes = self.simulations
+        self.env.set_turn(self.player_index)
+        self.env.board = state.copy()
+
+        # 1. Book move, or forced win by continuous threats
+        if self.search_book() or self.search_threats(deadline):
+            return self.action
+
+        # 2. Tree search from the reused (or a new) root
+        self.reuse_tree(state)
+        batch_size = self.num_workers if self.workers is not None else 1
+        while (max_nodes is None or self.nodes < max_nodes) and (deadline is None or time.time() < deadline):
+            if self.solved() or (self.stop_event is not None and self.stop_event.is_set()):
+                break
+            if self.workers is None:
+                self.simulate()
+            else:
+                self.simulate_batch(batch_size)
+            self.nodes += batch_size
+
+        # 3. Most visited move
+        self.pv = self.principal_variation()
+        if len(self.pv) > 0:
+            self.action = self.pv[0]
+        else:
+            actions = self.env.actions()
+            self.action = actions[0] if len(actions) > 0 else None
+        if self.verbose:
+            print('simulations: %s, tree nodes: %s, root visits: %s, pv: %s'%(self.nodes, len(self.pool), self.pool.visits[self.root], self.pv))
+        return self.action
+
+    def search_book(self):
+        if self.opening_book is None:
+            return False
+        move = self.opening_book.probe(self.env)
+        if move is None or self.env.legality.is_illegal(move, self.env.players.stone_code[self.player_index]):
+            return False
+        self.action = move
+        return True
+
+    def search_threats(self, deadline):
+        if self.threat_search is None:
+            return False
+        sequence = self.threat_search.solve(self.player_index, deadline, self.stop_event)
+        if sequence is None:
+            return False
+        if self.verbose:
+            print('forced win found: %s moves'%(len(sequence)))
+        self.action = sequence[0]
+        return True
+
+    def reuse_tree(self, state):
+        '''Set self.root to the node of state in the tree of the last search, if the moves since
+        are the agent's move and one opponent's move found in it. Otherwise start a new tree'''
+        root = None
+        if self.root is not None and self.root_board is not None and self.root_board.shape == state.shape:
+            changed = np.flatnonzero((state != self.root_board).flatten()).tolist()
+            previous = self.root_board.flatten()
+            stones = state.flatten()
+            own = [cell for cell in changed if stones[cell] == self.env.players.stone_code[self.player_index]]
+            opponent = [cell for cell in changed if stones[cell] == self.env.players.stone_code[self.opponent_index]]
+            # Only new stones, one of each player
+            if all(previous[cell] == 0 for cell in changed) and len(own) == 1 and len(opponent) == 1:
+                child = self.pool.child(self.root, own[0])
+                root = self.pool.child(child, opponent[0]) if child is not None else None
+            # Same position
+            elif len(changed) == 0:
+                root = self.root
+
+        if root is not None:
+            self.root = self.pool.compact(root)
+        else:
+            self.pool.clear()
+            self.root = self.pool.allocate(1)
+            self.pool.init(self.root, -1, self.opponent_index, -1)
+        self.root_board = state.copy()
+
+    def solved(self):
+        '''Whether the root move wins at once (then it is the only child, see expand())'''
+        pool = self.pool
+        return pool.num_children[self.root] == 1 and pool.winner[pool.first_child[self.root]] == self.player_index
+
+    def winning_moves(self, player_index, last):
+        '''Cells where player_index wins. Below the root, only the lines through the player's last stone can have new wins:
+        older ones were blocked, or the game would have ended (see expand())'''
+        if last is None:
+            return self.env.winning_moves(player_index)
+        return self.env.winning_moves(player_index, self.env.line_neighborhood[last])
+
+    def expand(self, node, player_index):
+        '''Allocate the children of node, with player_index to move. Returns False if the pool is full'''
+        env = self.env
+        opponent_index = env.players.other(player_index)
+        stone = env.players.stone_code[player_index]
+        own_last, opponent_last = self.last_moves() if node != self.root else (None, None)
+        # 1. Win at once
+        moves = self.winning_moves(player_index, own_last)[:1]
+        # 2. Block the opponent's wins
+        if len(moves) == 0:
+            moves = [move for move in self.winning_moves(opponent_index, opponent_last) if not env.legality.is_illegal(move, stone)]
+        # 3. Every legal move, in random order
+        if len(moves) == 0:
+            moves = env.actions()
+            self.rng.shuffle(moves)
+        if len(moves) == 0:
+            return False
+        first = self.pool.allocate(len(moves))
+        if first is None:
+            return False
+        for child, move in enumerate(moves, first):
+            self.pool.init(child, move, player_index, node)
+        self.pool.first_child[node] = first
+        self.pool.num_children[node] = len(moves)
+        return True
+
+    def select_child(self, node):
+        '''UCT: child maximizing mean result + exploration * sqrt(ln(visits of node) / visits of child).
+        Unvisited children are tried first'''
+        pool = self.pool
+        visits, wins = pool.visits, pool.wins
+        first = pool.first_child[node]
+        log_visits = math.log(max(visits[node], 1))
+        best_child, best_value = first, -1.0
+        for child in range(first, first + pool.num_children[node]):
+            n = visits[child]
+            if n == 0:
+                return child
+            value = wins[child] / n + self.exploration * math.sqrt(log_visits / n)
+            if value > best_value:
+                best_child, best_value = child, value
+        return best_child
+
+    def descend(self):
+        '''Select moves from the root to a leaf, pushing them on env, and expand the leaf.
+        Every node on the way counts the simulation at once (a loss until its result is known).
+        Returns (path of nodes, winner if the leaf is terminal, else NodePool.NOT_TERMINAL)'''
+        pool = self.pool
+        env = self.env
+        node = self.root
+        pool.visits[node] += 1
+        path = [node]
+        player_index = self.player_index
+        while pool.winner[node] == NodePool.NOT_TERMINAL:
+            # Leaf: expand it on its second visit (the root at once)
+            if pool.num_children[node] == 0:
+                if (pool.visits[node] < 2 and node != self.root) or not self.expand(node, player_index):
+                    break
+            node = self.select_child(node)
+            pool.visits[node] += 1
+            path.append(node)
+            if pool.visits[node] == 1:
+                winner, done = env.push(pool.move[node], player_index)
+                if done:
+                    pool.winner[node] = winner if winner is not None else NodePool.TIE
+            else:
+                env.push(pool.move[node], player_index)
+            player_index = env.players.other(player_index)
+        return path, pool.winner[node]
+
+    def last_moves(self):
+        '''[last move of the player to move, last move of the opponent] pushed on env since the root position,
+        None if unknown'''
+        history = self.env.history
+        return [history[-2][0] if len(history) >= 2 else None, history[-1][0] if len(history) >= 1 else None]
+
+    def backpropagate(self, path, winner):
+        pool = self.pool
+        for node in path:
+            if winner == pool.player[node]:
+                pool.wins[node] += 1.0
+            elif winner is None or winner == NodePool.TIE:
+                pool.wins[node] += 0.5
+
+    def simulate(self):
+        '''One simulation: descend, rollout and backpropagate'''
+        path, winner = self.descend()
+        if winner == NodePool.NOT_TERMINAL:
+            player_index = self.env.players.other(self.pool.player[path[-1]])
+            winner = rollout(self.env, player_index, self.last_moves(), self.rollout_moves, self.rng)
+        for _ in path[1:]:
+            self.env.pop()
+        self.backpropagate(path, winner)
+
+    def simulate_batch(self, batch_size):
+        '''batch_size simulations, with the rollouts run by the worker processes'''
+        paths, winners, tasks = list(), list(), list()
+        for _ in range(batch_size):
+            path, winner = self.descend()
+            if winner == NodePool.NOT_TERMINAL:
+                player_index = self.env.players.other(self.pool.player[path[-1]])
+                tasks.append((self.env.board, player_index, self.last_moves(), self.rollout_moves))
+            for _ in path[1:]:
+                self.env.pop()
+            paths.append(path)
+            winners.append(winner)
+
+        results = iter(self.workers.map(rollout_task, tasks))
+        for path, winner in zip(paths, winners):
+            if winner == NodePool.NOT_TERMINAL:
+                winner = next(results)
+            self.backpropagate(path, winner)
+
+    def principal_variation(self):
+        '''Most visited line of moves from the root'''
+        pool = self.pool
+        pv = list()
+        node = self.root
+        while pool.num_children[node] > 0:
+            first = pool.first_child[node]
+            node = max(range(first, first + pool.num_children[node]), key = pool.visits.__getitem__)
+            if pool.visits[node] == 0:
+                break
+            pv.append(pool.move[node])
+        return pv
@@ -0,0 +1,67 @@
+class MoveOrdering():
+    '''Orders moves for alpha-beta search, so that cutoffs happen on the first moves.
+
+    Order of moves:
+        1. Best move stored in the transposition table
+        2. Immediate wins of the player to move
+        3. Blocks of the opponent's immediate wins
+        4. Killer moves: moves which caused a cutoff at the same ply
+        5. Remaining moves by history score: sum of depth^2 over cutoffs caused by the move
+    '''
+    def __init__(self, env, num_killers = 2):
+        self.env = env
+        self.num_killers = num_killers
+        self.clear()
+
+    def clear(self):
+        # killers[ply]: list of up to num_killers moves, most recent first
+        self.killers = list()
+        self.history = [0] * (self.env.board_size * self.env.board_size)
+
+    def order(self, actions, ply, best_move, player_index, opponent_index, threats = True):
+        '''Return actions (list of cells) in search order, for player_index to move at ply.
+        threats: whether to look for immediate wins and blocks (not worth it right above the leaves)'''
+        first = list()
+        # 1. Transposition table move
+        if best_move is not None:
+            first.append(best_move)
+        # 2, 3. Immediate wins and blocks
+        if threats:
+            for action in actions:
+                if self.env.backend.get(action) == 0 and self.env.is_winning_move(action, player_index):
+                    first.append(action)
+            for action in actions:
+                if self.env.backend.get(action) == 0 and self.env.is_winning_move(action, opponent_index):
+                    first.append(action)
+        # 4. Killer moves
+        if ply < len(self.killers):
+            first.extend(self.killers[ply])
+
+        # Keep only actions, without duplicates
+        action_set = set(actions)
+        ordered = list()
+        for action in first:
+            if action in action_set:
+                ordered.append(action)
+                action_set.discard(action)
+        # 5. History heuristic (stable sort keeps the original order among equal scores)
+        rest = [action for action in actions if action in action_set]
+        rest.sort(key = self.history.__getitem__, reverse = True)
+        return ordered + rest
+
+    def cutoff(self, action, ply, depth):
+        '''Record action which caused a cutoff at ply, with depth plies searched below it'''
+        while len(self.killers) <= ply:
+            self.killers.append(list())
+        killers = self.killers[ply]
+        if action in killers:
+            killers.remove(action)
+        killers.insert(0, action)
+        del killers[self.num_killers:]
+        self.history[action] += depth * depth
+
+    def advance(self, plies):
+        '''Keep killers and history for a search from plies moves later: killers move up by plies,
+        and history scores are halved, so cutoffs of the new search soon outweigh the old ones'''
+        del self.killers[:plies]
+        self.history = [score // 2 for score in self.history]
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import numpy as np
+from gomoku import Gomoku
+from record import RecordReader
+
+# One book entry: canonical position key, best move in canonical cells, games played from the position
+# and mean result of the move for the side to move (1 win, 0.5 tie, 0 loss). Entries are sorted by key
+ENTRY = np.dtype([('key', '<u8'), ('move', '<u2'), ('games', '<u4'), ('score', '<f4')])
+
+def metadata_path(path):
+    return path + '.json'
+
+class OpeningBook():
+    '''Best moves of opening positions, looked up by a symmetry-normalised position hash.
+
+    The key of a position is Gomoku.canonical_key(), the smallest Zobrist hash among its 8 symmetric positions,
+    so positions which are rotations or reflections of each other share one entry.
+    Moves are stored in the cells of that canonical position, and mapped back on lookup.
+
+    On disk, a book is a .npy array of ENTRY sorted by key, and a small JSON file (path + '.json')
+    with the board it was built for. The array is memory-mapped on the first lookup,
+    and looked up by binary search, so only the pages visited are read'''
+    def __init__(self, path):
+        self.path = path
+        with open(metadata_path(path)) as f:
+            self.metadata = json.load(f)
+        self.board_size = self.metadata['board_size']
+        self.win_condition = self.metadata['win_condition']
+        self.zobrist_seed = self.metadata['zobrist_seed']
+        self.max_ply = self.metadata['max_ply']
+        self.entries = None
+
+    def __len__(self):
+        return len(self.load())
+
+    def load(self):
+        if self.entries is None:
+            # memmap cannot map empty arrays
+            if self.metadata['num_entries'] > 0:
+                self.entries = np.load(self.path, mmap_mode = 'r')
+            else:
+                self.entries = np.zeros(0, dtype = ENTRY)
+        return self.entries
+
+    def matches(self, env):
+        '''Whether the book was built for the board and Zobrist keys of env (sparse boards have other keys)'''
+        return (not env.sparse and env.board_size == self.board_size and env.win_condition == self.win_condition
+                and env.zobrist_seed == self.zobrist_seed)
+
+    def probe(self, env):
+        '''Return book move of the position of env (cell), or None if the position is not in the book'''
+        if env.num_stones > self.max_ply or not self.matches(env):
+            return None
+        entries = self.load()
+        if len(entries) == 0:
+            return None
+        key, transform = env.canonical_key()
+        index = int(np.searchsorted(entries['key'], key))
+        if index == len(entries) or int(entries['key'][index]) != key:
+            return None
+        return env.inverse_transform_cell(int(entries['move'][index]), transform)
+
+def build(games, path, board_size = 15, win_condition = 5, zobrist_seed = 0, max_ply = 12, min_games = 2):
+    '''Build a book from games (dicts with 'moves' and 'winner', as written by selfplay.py or read by record.RecordReader)
+    of the given board, and save it to path. Positions up to max_ply moves are counted,
+    and for each, the move with the best mean result among moves played in at least min_games games is kept.
+    Returns number of entries'''
+    env = Gomoku(board_size = board_size, win_condition = win_condition, zobrist_seed = zobrist_seed)
+
+    # 1. Results of every (canonical position, canonical move)
+    # stats[key][move] = [games, score]
+    stats = dict()
+    num_games = 0
+    for game in games:
+        if game['board_size'] != board_size or game['win_condition'] != win_condition:
+            continue
+        num_games += 1
+        env.reset()
+        for cell in game['moves'][:max_ply]:
+            key, transform = env.canonical_key()
+            player_index = env.next_player
+            if game['winner'] is None:
+                score = 0.5
+            else:
+                score = 1.0 if game['winner'] == player_index else 0.0
+            move_stats = stats.setdefault(key, dict()).setdefault(env.transform_cell(cell, transform), [0, 0.0])
+            move_stats[0] += 1
+            move_stats[1] += score
+            env.push(cell)
+
+    # 2. Best move of every position
+    rows = list()
+    for key, moves in stats.items():
+        candidates = [(move_score / move_games, move_games, move) for move, (move_games, move_score) in moves.items() if move_games >= min_games]
+        if len(candidates) == 0:
+            continue
+        score, move_games, move = max(candidates)
+        rows.append((key, move, move_games, score))
+    entries = np.array(rows, dtype = ENTRY)
+    entries.sort(order = 'key')
+
+    # 3. Save
+    np.save(path, entries)
+    # np.save() appends .npy to paths without it
+    if not path.endswith('.npy'):
+        os.replace(path + '.npy', path)
+    with open(metadata_path(path), 'w') as f:
+        json.dump({'board_size': board_size, 'win_condition': win_condition, 'zobrist_seed': zobrist_seed,
+                   'max_ply': max_ply, 'min_games': min_games, 'num_games': num_games, 'num_entries': len(entries)}, f)
+    return len(entries)
+
+def read_games(path):
+    '''Games of a selfplay.py output: JSON lines (.jsonl), or record.RecordWriter format otherwise'''
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from RecordReader(path)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Build an opening book from self-play games')
+    parser.add_argument('games', nargs = '+', help = 'selfplay.py outputs (.jsonl, or binary records)')
+    parser.add_argument('--output', default = 'book.npy')
+    parser.add_argument('--board-size', type = int, default = 15)
+    parser.add_argument('--win-condition', type = int, default = 5)
+    parser.add_argument('--max-ply', type = int, default = 12, help = 'positions up to this many moves are stored')
+    parser.add_argument('--min-games', type = int, default = 2, help = 'games a move needs to be chosen')
+    args = parser.parse_args()
+
+    games = (game for path in args.games for game in read_games(path))
+    num_entries = build(games, args.output, args.board_size, args.win_condition, max_ply = args.max_ply, min_games = args.min_games)
+    print('%s positions saved to %s'%(num_entries, args.output))
+
+if __name__ == '__main__':
+    main()
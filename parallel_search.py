@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+from gomoku import Gomoku
+from agent import Iterative_Deepening_Alpha_Beta, SearchTimeout, WIN_SCORE, INFINITY
+from move_ordering import MoveOrdering
+from threat_search import ThreatSpaceSearch
+from opening_book import OpeningBook
+
+# State of each worker process, set by init_worker()
+worker = dict()
+
+def init_worker(env_kwargs, player_index, agent_kwargs, shared_alpha, stop):
+    '''Create the worker's own environment and agent once, so its tables stay allocated between searches'''
+    env = Gomoku(**env_kwargs)
+    worker['agent'] = Iterative_Deepening_Alpha_Beta(env, player_index, mode = 'numeric', threat_search = None, verbose = False, **agent_kwargs)
+    worker['shared_alpha'] = shared_alpha
+    worker['stop'] = stop
+
+def search_root_moves(board, moves, max_depth, deadline, max_nodes):
+    '''Search root moves to max_depth, sharing alpha with the other workers, until deadline or max_nodes nodes.
+    Returns (pid, best move, its value, whether the value is exact, number of moves searched, nodes, seconds).
+    The value is only an upper bound if no move of the worker beat alpha'''
+    agent = worker['agent']
+    shared_alpha = worker['shared_alpha']
+    stop = worker['stop']
+    env = agent.env
+    env.set_turn(agent.player_index)
+    env.board = board
+    agent.max_depth = max_depth
+    agent.depth = 1
+    agent.nodes = 0
+    agent.start_clock(deadline, max_nodes)
+    start_time = time.time()
+
+    best_move, best_value, exact = None, -INFINITY, False
+    num_searched = 0
+    for move in moves:
+        if stop.value:
+            break
+        # Search against the best value found by any worker so far
+        alpha = shared_alpha.value
+        agent.nodes += 1
+        try:
+            winner, done = env.push(move, agent.player_index)
+            if done == True:
+                v = agent.perceive_score(winner)
+            else:
+                v = agent.min_score(alpha, INFINITY)
+        # Deadline: the move is not searched
+        except SearchTimeout:
+            agent.unwind()
+            break
+        env.pop()
+        num_searched += 1
+
+        # min_score() fails soft: values not above alpha are only upper bounds, so they cannot be the best move
+        if done == True or v > alpha:
+            if not exact or v > best_value:
+                best_move, best_value, exact = move, v, True
+            with shared_alpha.get_lock():
+                if v > shared_alpha.value:
+                    shared_alpha.value = v
+        elif best_move is None:
+            best_move, best_value = move, v
+    return os.getpid(), best_move, best_value, exact, num_searched, agent.nodes, time.time() - start_time
+
+class Parallel_Alpha_Beta():
+    '''
+    Root parallel iterative deepening alpha-beta search (numeric mode).
+    Root moves of each iteration are split across a pool of persistent worker processes,
+    which share the best value found so far (alpha) as it improves.
+
+    num_workers: number of worker processes (default: number of CPUs)
+    timelimit: seconds per search() called without deadline and max_nodes, or None
+    max_depth: maximum depth to search, or None
+    opening_book: path of a book built by opening_book.py, or None
+    verbose: whether to print progress of the search
+    '''
+    def __init__(self, env, player_index = None, num_workers = None, timelimit = 10.0, max_depth = None, threat_search = 'vcf', opening_book = None, verbose = True, **agent_kwargs):
+        self.env = env
+        self.player_index = player_index
+        self.opponent_index = self.env.players.other(player_index)
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.timelimit = timelimit
+        self.limit_depth = max_depth
+        self.verbose = verbose
+        self.action = None
+        self.nodes = 0
+        self.threat_search = ThreatSpaceSearch(self.env, mode = threat_search) if threat_search is not None else None
+        self.opening_book = OpeningBook(opening_book) if opening_book is not None else None
+        # Orders the root moves (wins and blocks first)
+        self.move_ordering = MoveOrdering(self.env)
+
+        # Shared between workers
+        self.shared_alpha = multiprocessing.Value('q', -INFINITY)
+        self.stop = multiprocessing.Value('b', 0)
+        env_kwargs = {'board_size': env.board_size, 'win_condition': env.win_condition, 'candidate_distance': env.candidate_distance}
+        self.pool = multiprocessing.Pool(self.num_workers, initializer = init_worker,
+                                         initargs = (env_kwargs, player_index, agent_kwargs, self.shared_alpha, self.stop))
+        # Tasks of an interrupted iteration, still running
+        self.pending = list()
+        # {pid: [nodes, seconds]} of the last search
+        self.worker_stats = dict()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def nodes_per_second(self):
+        '''Return {pid: nodes per second} of every worker in the last search'''
+        return {pid: (nodes / seconds if seconds > 0 else 0.0) for pid, (nodes, seconds) in self.worker_stats.items()}
+
+    def search(self, state, deadline = None, max_nodes = None):
+        '''
+        Like Iterative_Deepening_Alpha_Beta.search(), returns the best action of the last completed iteration.
+        deadline: time.time() value to stop at, or None
+        max_nodes: node budget of all workers together, or None. Each iteration splits what is left between its tasks
+        Without both, the search stops after timelimit seconds
+        '''
+        self.action = None
+        self.max_depth = 2
+        self.nodes = 0
+        if deadline is None and max_nodes is None and self.timelimit is not None:
+            deadline = time.time() + self.timelimit
+        self.worker_stats = dict()
+
+        # Wait for tasks of an interrupted search to stop
+        for result in self.pending:
+            result.wait()
+        self.pending = list()
+
+        # 1. Book move, or forced win by continuous threats
+        self.env.set_turn(self.player_index)
+        self.env.board = state.copy()
+        if self.opening_book is not None:
+            move = self.opening_book.probe(self.env)
+            if move is not None and not self.env.is_illegal(move, self.env.players.stone_code[self.player_index]):
+                self.action = move
+                return self.action
+        if self.threat_search is not None:
+            sequence = self.threat_search.solve(self.player_index, deadline)
+            if sequence is not None:
+                self.action = sequence[0]
+                return self.action
+
+        # 2. Iterative deepening over the pool
+        actions = self.env.actions()
+        np.random.shuffle(actions)
+        actions = self.move_ordering.order(actions, 0, None, self.player_index, self.opponent_index)
+        num_empty = self.env.board_size * self.env.board_size - self.env.num_stones
+        v = 0
+        while(abs(v) < WIN_SCORE and self.max_depth <= num_empty and (self.limit_depth is None or self.max_depth <= self.limit_depth)):
+            if self.verbose:
+                print('searching with max_depth:%s on %s workers'%(self.max_depth, self.num_workers))
+            # Best action so far first
+            if self.action is not None:
+                actions.remove(self.action)
+                actions.insert(0, self.action)
+            self.shared_alpha.value = -INFINITY
+            self.stop.value = 0
+
+            # 1] Split root moves, so every worker gets some of the best moves
+            chunks = [actions[i::self.num_workers] for i in range(self.num_workers)]
+            chunks = [chunk for chunk in chunks if len(chunk) > 0]
+            task_nodes = None
+            if max_nodes is not None:
+                task_nodes = (max_nodes - self.nodes) // len(chunks)
+                if task_nodes <= 0:
+                    break
+            results = [self.pool.apply_async(search_root_moves, (state, chunk, self.max_depth, deadline, task_nodes)) for chunk in chunks]
+
+            # 2] Wait until all workers finish, or the deadline
+            completed = list()
+            for result in results:
+                timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+                result.wait(timeout)
+                if not result.ready():
+                    break
+                completed.append(result.get())
+            self.nodes += sum(result[5] for result in completed)
+            # Deadline or node budget: stop the workers and keep the last completed iteration
+            if len(completed) < len(results) or any(result[4] < len(chunk) for result, chunk in zip(completed, chunks)):
+                self.stop.value = 1
+                self.pending = results
+                break
+
+            # 3] Best move of this iteration, among the exact values (the others are upper bounds)
+            v = -INFINITY
+            for pid, move, value, exact, num_searched, nodes, seconds in completed:
+                stats = self.worker_stats.setdefault(pid, [0, 0.0])
+                stats[0] += nodes
+                stats[1] += seconds
+                if move is not None and exact and value > v:
+                    v = value
+                    self.action = move
+            if self.verbose:
+                for pid, nps in self.nodes_per_second().items():
+                    print('worker %s: %.0f nodes/s'%(pid, nps))
+            self.max_depth += 1
+        # Interrupted first iteration: the first action in search order (wins and blocks first)
+        if self.action is None and len(actions) > 0:
+            self.action = actions[0]
+        return self.action
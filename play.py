@@ -8,6 +8,8 @@ from multiprocessing import Process
 from enum import IntEnum
 from gomoku import Gomoku
 from agent import Iterative_Deepening_Alpha_Beta
+from mcts import Monte_Carlo_Tree_Search
+from ponder import Ponderer
 from tools import my_random as mrandom
 from tools.tools import Printer
 
@@ -37,6 +39,12 @@ class Timer():
     def set_timer(self, time):
         signal.setitimer(signal.ITIMER_REAL, time)
 
+    def cancel_timer(self):
+        if platform.system() == 'Windows':
+            self.timer_process.terminate()
+        else:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
     def windows_setitimer(self, dummy, time):
         self.timer_process = Process(target=timer_function, args=(time,))
         print('process created')
@@ -48,6 +56,10 @@ class Timer():
 
 # 0. Initialize environment
 timelimit = 10.0
+# Agent: 'alpha_beta' (agent.Iterative_Deepening_Alpha_Beta) or 'mcts' (mcts.Monte_Carlo_Tree_Search)
+agent_type = 'alpha_beta'
+# Whether the agent searches the predicted reply while the user thinks
+pondering = True
 env = Gomoku(board_size = 19)
 timer = Timer()
 printer = Printer()
@@ -57,8 +69,8 @@ input_valid = False
 while(input_valid == False):
     # Print options
     print('Choose your stone')
-    for i, player_info in env.player_info.iterrows():
-        print('%s: %s, '%( i, player_info['name']), end = '')
+    for player in env.players:
+        print('%s: %s, '%( player.index, player.name), end = '')
     print('\n',end='')
 
     # Receive input, convert to int
@@ -71,17 +83,21 @@ while(input_valid == False):
         continue
 
     # Check if player selection is valid
-    if i in env.player_info.index:
+    if i in env.players:
         player_index = i
         input_valid = True
     else:
         print('Invalid input! Choose between the options')
         continue
-print('You chose %s. Game start'%(env.player_info.loc[player_index]['name']))
+print('You chose %s. Game start'%(env.players[player_index].name))
 
 # 1-2. Create Agnet
-agent_index = env.player_info[env.player_info.index != player_index].index[0]
-agent = Iterative_Deepening_Alpha_Beta(env = copy.deepcopy(env), player_index = agent_index)
+agent_index = env.players.other(player_index)
+if agent_type == 'mcts':
+    agent = Monte_Carlo_Tree_Search(env = copy.deepcopy(env), player_index = agent_index)
+else:
+    agent = Iterative_Deepening_Alpha_Beta(env = copy.deepcopy(env), player_index = agent_index)
+ponderer = Ponderer(agent) if pondering else None
 
 # 2. Game start
 winner = None
@@ -89,17 +105,17 @@ done = False
 while(done == False):
     # 0-1] Print
     # os.system('clear')
-    print('Next Player: %s'%( env.player_info.loc[env.next_player]['name'] ) )
+    print('Next Player: %s'%( env.players[env.next_player].name ) )
     action = None
     env.show()
 
-    # 0-2] Set time limit
-    timer.set_timer(timelimit)
-
     # 1-1] Game move Search (try&except to abort code. Did not use signal handling since it cannot interrupt user input() )
     try:
-        # 1) User's turn
+        # 1) User's turn (timer signal only interrupts input(), never the search)
         if env.next_player == player_index:
+            if ponderer is not None:
+                ponderer.start(env.board)
+            timer.set_timer(timelimit)
             # Receive valid input
             input_valid = False
             while(input_valid == False):
@@ -112,27 +128,26 @@ while(done == False):
                     if (row not in env.action_space[0]) or (column not in env.action_space[1]):
                         raise InvalidActionspace('Row: [%s ~ %s], Column: [%s ~ %s]'%(env.action_space[0][0], env.action_space[0][-1], env.action_space[1][0], env.action_space[1][-1]))
                     else:
-                        action = (row, column)
+                        action = env.to_cell((row, column))
                         input_valid = True
                 # Loop for new input only when these errors happen. (Not timeout or other types of errors)
                 except ValueError as error:
                     print(error)
                 except InvalidActionspace as error:
                     print(error)
+            timer.cancel_timer()
 
-        # 2) Agent's turn
+        # 2) Agent's turn: search stops by itself at the deadline
         else:
-            action = agent.search(env.board)
+            action = agent.search(env.board, deadline = time.time() + timelimit)
 
-    # 1-2] Timeout
+    # 1-2] Timeout of user's input - Random selection with Uniform probability
     except Timeout as timeout_message:
         print(timeout_message)
-        # 1) User's turn - Random selection with Uniform probability
-        if env.next_player == player_index:
-            pass
-        # 2) Agent's turn
-        else:
-            action = agent.action
+
+    # The agent may search again: stop pondering (after the user's input, or its timeout)
+    if ponderer is not None:
+        ponderer.stop(action)
 
     # If there is no action - Random selection with Uniform probability
     if action == None:
@@ -145,6 +160,6 @@ while(done == False):
 # 3. Game results
 env.show()
 if winner != None:
-    print('Winner is: %s'%(env.player_info.loc[winner]['name']))
+    print('Winner is: %s'%(env.players[winner].name))
 else:
     print("It's a tie!")
@@ -0,0 +1,50 @@
+class Player():
+    '''One player of the game'''
+    __slots__ = ('index', 'stone_code', 'name')
+
+    def __init__(self, index, stone_code, name):
+        self.index = index
+        self.stone_code = stone_code
+        self.name = name
+
+    def __repr__(self):
+        return 'Player(index=%s, stone_code=%s, name=%s)'%(self.index, self.stone_code, self.name)
+
+class Players():
+    '''Players in turn order, looked up by player index.
+
+    stone_code: {player index: stone code}
+    stone_to_player: {stone code: player index}'''
+    def __init__(self, players):
+        self.players = tuple(players)
+        self.index = tuple(player.index for player in self.players)
+        self.stone_code = {player.index: player.stone_code for player in self.players}
+        self.stone_to_player = {player.stone_code: player.index for player in self.players}
+        self.by_index = {player.index: player for player in self.players}
+
+    def __getitem__(self, player_index):
+        return self.by_index[player_index]
+
+    def __contains__(self, player_index):
+        return player_index in self.by_index
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def __len__(self):
+        return len(self.players)
+
+    def other(self, player_index):
+        '''Index of the opponent of player_index (2 player games)'''
+        for index in self.index:
+            if index != player_index:
+                return index
+
+    def to_dataframe(self):
+        '''Players as pandas DataFrame, for display'''
+        import pandas as pd
+        return pd.DataFrame(
+        {'stone_code': [player.stone_code for player in self.players],
+        'name': [player.name for player in self.players]}
+        , index=list(self.index)
+        )
@@ -0,0 +1,75 @@
+import threading
+import time
+
+class Ponderer():
+    '''Searches on the opponent's time in a background thread.
+
+    After the agent's move, start() searches the position after the reply predicted by the agent's
+    principal variation (agent.pv[1]), until stop() is called or max_seconds have passed.
+    The search runs on the agent itself, so when the opponent plays the predicted reply, the next agent.search()
+    of that position continues from the transposition table, move ordering (or tree, for mcts.Monte_Carlo_Tree_Search)
+    and depth reached while pondering. Otherwise Iterative_Deepening_Alpha_Beta keeps its transposition table
+    and move ordering as without pondering (see Iterative_Deepening_Alpha_Beta.advance()),
+    while Monte_Carlo_Tree_Search starts a new tree (the tree kept is the one of the predicted reply).
+
+    The agent must not be used by another thread between start() and stop().
+    agent: agent.Iterative_Deepening_Alpha_Beta or mcts.Monte_Carlo_Tree_Search
+    max_seconds: longest time to ponder
+    '''
+    def __init__(self, agent, max_seconds = 600.0):
+        self.agent = agent
+        self.max_seconds = max_seconds
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.predicted = None
+        # Ponder hits and misses so far
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, board):
+        '''Return the opponent's reply expected by the agent's last search, if its cell is empty on board, or None'''
+        agent = self.agent
+        if len(agent.pv) < 2 or agent.action is None or board.flat[agent.action] == 0:
+            return None
+        reply = agent.pv[1]
+        if board.flat[reply] != 0:
+            return None
+        return reply
+
+    def start(self, board):
+        '''Start pondering on board, the position after the agent's last move (opponent to move).
+        Returns the predicted reply, or None if there is nothing to ponder'''
+        self.stop()
+        self.predicted = self.predict(board)
+        if self.predicted is None:
+            return None
+        board = board.copy()
+        board.flat[self.predicted] = self.agent.env.players.stone_code[self.agent.opponent_index]
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.run, args = (board,), daemon = True)
+        self.thread.start()
+        return self.predicted
+
+    def run(self, board):
+        agent = self.agent
+        verbose = agent.verbose
+        agent.verbose = False
+        agent.stop_event = self.stop_event
+        try:
+            agent.search(board, deadline = time.time() + self.max_seconds)
+        finally:
+            agent.stop_event = None
+            agent.verbose = verbose
+
+    def stop(self, reply = None):
+        '''Stop pondering and wait for the search to return. reply: the opponent's actual move, to count hits'''
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        if reply is not None:
+            if reply == self.predicted:
+                self.hits += 1
+            else:
+                self.misses += 1
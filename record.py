@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from gomoku import Gomoku
+
+# Codes of player configuration in headers
+MODES = ('priority', 'numeric', 'mcts')
+THREAT_SEARCHES = (None, 'vcf', 'vct')
+
+# Configuration of one player
+PLAYER = np.dtype([('mode', 'u1'), ('threat_search', 'u1'), ('max_nodes', '<u4')])
+# Header of one game, followed by num_moves uint16 cells (row_index * board_size + column_index)
+HEADER = np.dtype([('board_size', 'u1'), ('win_condition', 'u1'),
+                   ('result', 'u1'),        # Index of the winner, 0 for a tie
+                   ('num_moves', '<u2'),
+                   ('seed', '<i8'),
+                   ('players', PLAYER, (2,))])
+MOVE = np.dtype('<u2')
+OFFSET = np.dtype('<u8')
+
+def index_path(path):
+    return path + '.idx'
+
+def player_config(mode = 'numeric', threat_search = 'vcf', max_nodes = None):
+    '''Player configuration as stored in headers'''
+    return (MODES.index(mode), THREAT_SEARCHES.index(threat_search), max_nodes if max_nodes is not None else 0)
+
+class RecordWriter():
+    '''Appends games to a record file, and their byte offsets to its index file (path + '.idx')'''
+    def __init__(self, path):
+        self.path = path
+        self.data_file = open(path, 'ab')
+        self.index_file = open(index_path(path), 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, moves, board_size, win_condition, winner = None, players = None, seed = 0):
+        '''Append one game. moves: list of cells, winner: player index or None (tie),
+        players: two player_config() tuples'''
+        header = np.zeros(1, dtype = HEADER)
+        header['board_size'] = board_size
+        header['win_condition'] = win_condition
+        header['result'] = winner if winner is not None else 0
+        header['num_moves'] = len(moves)
+        header['seed'] = seed
+        if players is not None:
+            header['players'][0] = np.array(list(players), dtype = PLAYER)
+
+        offset = self.data_file.seek(0, os.SEEK_END)
+        self.data_file.write(header.tobytes())
+        self.data_file.write(np.asarray(moves, dtype = MOVE).tobytes())
+        self.index_file.write(np.array([offset], dtype = OFFSET).tobytes())
+
+    def flush(self):
+        self.data_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+class RecordReader():
+    '''Reads games of a record file through np.memmap, without loading the file into memory'''
+    def __init__(self, path):
+        self.path = path
+        # memmap cannot map empty files
+        if os.path.getsize(path) > 0:
+            self.data = np.memmap(path, dtype = np.uint8, mode = 'r')
+            self.offsets = np.memmap(index_path(path), dtype = OFFSET, mode = 'r')
+        else:
+            self.data = np.zeros(0, dtype = np.uint8)
+            self.offsets = np.zeros(0, dtype = OFFSET)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, game_index):
+        return self.game(game_index)
+
+    def __iter__(self):
+        for game_index in range(len(self)):
+            yield self.game(game_index)
+
+    def header(self, game_index):
+        return np.frombuffer(self.data, dtype = HEADER, count = 1, offset = int(self.offsets[game_index]))[0]
+
+    def moves(self, game_index):
+        '''Moves of a game, as uint16 array viewing the mapped file'''
+        offset = int(self.offsets[game_index])
+        header = np.frombuffer(self.data, dtype = HEADER, count = 1, offset = offset)[0]
+        return np.frombuffer(self.data, dtype = MOVE, count = int(header['num_moves']), offset = offset + HEADER.itemsize)
+
+    def game(self, game_index):
+        '''Game as dict'''
+        header = self.header(game_index)
+        result = int(header['result'])
+        return {'board_size': int(header['board_size']), 'win_condition': int(header['win_condition']),
+                'winner': result if result != 0 else None, 'seed': int(header['seed']),
+                'players': [{'mode': MODES[player['mode']], 'threat_search': THREAT_SEARCHES[player['threat_search']],
+                             'max_nodes': int(player['max_nodes']) if player['max_nodes'] > 0 else None}
+                            for player in header['players']],
+                'moves': self.moves(game_index).tolist()}
+
+    def replay(self, game_index, ply = None, env = None):
+        '''Return Gomoku env after the first ply moves of a game (all moves if ply is None).
+        If env is given, it is reset and reused'''
+        header = self.header(game_index)
+        if env is None:
+            env = Gomoku(board_size = int(header['board_size']), win_condition = int(header['win_condition']))
+        else:
+            env.reset()
+        for cell in self.moves(game_index)[:ply].tolist():
+            env.push(cell)
+        return env
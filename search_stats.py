@@ -0,0 +1,91 @@
+import json
+import time
+
+class SearchStats():
+    '''Statistics of Iterative_Deepening_Alpha_Beta.search(), for every iteration (max_depth):
+        nodes: positions searched
+        cutoffs: beta (or alpha) cutoffs, and first_move_cutoff_rate: share of them caused by the first move tried
+        ebf: effective branching factor, nodes of the iteration / nodes of the previous iteration
+        seconds, nps: time of the iteration, and nodes per second
+        tt_hit_rate: share of transposition table probes which found the position
+
+    log_path: if given, a JSON line with the statistics of every search (move) is appended to it
+    '''
+    def __init__(self, log_path = None):
+        self.log_path = log_path
+        self.num_searches = 0
+        self.reset()
+
+    def reset(self):
+        self.iterations = list()
+        self.action = None
+        self.start_time = time.time()
+        self.seconds = 0.0
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def start_search(self):
+        self.reset()
+
+    def start_iteration(self, max_depth, nodes, transposition_table):
+        self.max_depth = max_depth
+        self.iteration_start = time.time()
+        self.iteration_nodes = nodes
+        self.iteration_probes = transposition_table.probes
+        self.iteration_hits = transposition_table.hits
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def cutoff(self, move_index):
+        '''Record a cutoff caused by the move_index-th move tried (0: first)'''
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+
+    def end_iteration(self, nodes, transposition_table, completed = True):
+        seconds = time.time() - self.iteration_start
+        nodes = nodes - self.iteration_nodes
+        probes = transposition_table.probes - self.iteration_probes
+        hits = transposition_table.hits - self.iteration_hits
+        previous = self.iterations[-1] if len(self.iterations) > 0 else None
+        self.iterations.append({
+        'max_depth': self.max_depth,
+        'completed': completed,
+        'nodes': nodes,
+        'cutoffs': self.cutoffs,
+        'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs > 0 else None,
+        'ebf': nodes / previous['nodes'] if previous is not None and previous['nodes'] > 0 else None,
+        'seconds': seconds,
+        'nps': nodes / seconds if seconds > 0 else None,
+        'tt_hit_rate': hits / probes if probes > 0 else None,
+        })
+
+    def end_search(self, action, nodes):
+        '''Record the result of the search, and append it to the log'''
+        self.action = action
+        self.nodes = nodes
+        self.seconds = time.time() - self.start_time
+        self.num_searches += 1
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as f:
+                f.write(self.to_json() + '\n')
+
+    def depth(self):
+        '''max_depth of the last completed iteration, or None'''
+        completed = [iteration['max_depth'] for iteration in self.iterations if iteration['completed']]
+        return completed[-1] if len(completed) > 0 else None
+
+    def to_dict(self):
+        return {
+        'search': self.num_searches,
+        'action': self.action,
+        'depth': self.depth(),
+        'nodes': self.nodes,
+        'seconds': self.seconds,
+        'nps': self.nodes / self.seconds if self.seconds > 0 else None,
+        'iterations': self.iterations,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
@@ -0,0 +1,122 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+import numpy as np
+from gomoku import Gomoku
+from agent import Iterative_Deepening_Alpha_Beta
+from mcts import Monte_Carlo_Tree_Search
+from record import RecordWriter, player_config
+
+# Configuration and agents of each worker process, set by init_worker()
+worker = dict()
+
+def init_worker(config):
+    '''Create one agent per player once, and reuse them for every game of the worker'''
+    worker['config'] = config
+    env = Gomoku(board_size = config['board_size'], win_condition = config['win_condition'])
+    worker['env'] = env
+    worker['agents'] = {player.index: make_agent(config, player.index) for player in env.players}
+
+def make_agent(config, player_index):
+    '''Agent of player_index: Monte_Carlo_Tree_Search for mode 'mcts', Iterative_Deepening_Alpha_Beta otherwise'''
+    env = Gomoku(board_size = config['board_size'], win_condition = config['win_condition'])
+    if config['mode'] == 'mcts':
+        return Monte_Carlo_Tree_Search(env, player_index, threat_search = config['threat_search'], verbose = False)
+    return Iterative_Deepening_Alpha_Beta(env, player_index, mode = config['mode'], threat_search = config['threat_search'],
+                                          transposition_size = config['transposition_size'], verbose = False)
+
+def play_game(game_index):
+    '''Play one game, seeded by (seed + game_index). Returns game record (dict)'''
+    config = worker['config']
+    env = worker['env']
+    agents = worker['agents']
+    seed = config['seed'] + game_index
+    np.random.seed(seed % 2**32)
+    rng = random.Random(seed)
+    for agent in agents.values():
+        if isinstance(agent, Monte_Carlo_Tree_Search):
+            agent.rng.seed(seed)
+    start_time = time.time()
+
+    env.reset()
+    moves = list()
+    winner, done = None, False
+    while(done == False):
+        actions = env.actions()
+        # 1. Random opening moves, so games with different seeds differ
+        if len(moves) < config['opening_moves']:
+            action = rng.choice(actions)
+        # 2. Agent's move within the node or time budget
+        else:
+            deadline = time.time() + config['time_limit'] if config['time_limit'] is not None else None
+            action = agents[env.next_player].search(env.board, deadline = deadline, max_nodes = config['max_nodes'])
+            if action is None:
+                action = rng.choice(actions)
+        winner, done = env.push(action)
+        moves.append(int(action))
+        # Both players passed by illegal moves: the remaining cells are illegal, so the game is a tie
+        if len(env.history) >= 2 and env.history[-1][0] is None and env.history[-2][0] is None:
+            winner, done = None, True
+
+    return {'game': game_index, 'seed': seed,
+            'board_size': config['board_size'], 'win_condition': config['win_condition'],
+            'winner': winner, 'moves': moves,
+            'players': {'mode': config['mode'], 'threat_search': config['threat_search'],
+                        'max_nodes': config['max_nodes'], 'time_limit': config['time_limit']},
+            'seconds': time.time() - start_time}
+
+def self_play(num_games, num_workers = None, board_size = 15, win_condition = 5, mode = 'numeric', threat_search = 'vcf',
+              max_nodes = 2000, time_limit = None, opening_moves = 2, seed = 0, transposition_size = 2**16):
+    '''Play num_games games of the agent against itself over a pool of worker processes.
+    Yields game records as games finish (not in game order).
+    Every move is limited by max_nodes (reproducible for a seed) and/or time_limit seconds'''
+    config = {'board_size': board_size, 'win_condition': win_condition, 'mode': mode, 'threat_search': threat_search,
+              'max_nodes': max_nodes, 'time_limit': time_limit, 'opening_moves': opening_moves, 'seed': seed,
+              'transposition_size': transposition_size}
+    num_workers = num_workers if num_workers is not None else os.cpu_count()
+    with multiprocessing.Pool(num_workers, initializer = init_worker, initargs = (config,)) as pool:
+        for record in pool.imap_unordered(play_game, range(num_games)):
+            yield record
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Play the agent against itself and write game records')
+    parser.add_argument('--games', type = int, default = 100)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--board-size', type = int, default = 15)
+    parser.add_argument('--win-condition', type = int, default = 5)
+    parser.add_argument('--mode', default = 'numeric', choices = ['priority', 'numeric', 'mcts'],
+                        help = 'alpha-beta value mode, or mcts for Monte Carlo tree search')
+    parser.add_argument('--threat-search', default = 'vcf', choices = ['vcf', 'vct', 'none'])
+    parser.add_argument('--max-nodes', type = int, default = 2000, help = 'node budget per move (simulations for mcts, 0: none)')
+    parser.add_argument('--time-limit', type = float, default = None, help = 'seconds per move')
+    parser.add_argument('--opening-moves', type = int, default = 2, help = 'random moves at the start of every game')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = 'selfplay.jsonl', help = 'file to append game records to')
+    parser.add_argument('--format', default = 'jsonl', choices = ['jsonl', 'binary'],
+                        help = 'jsonl: one JSON object per line, binary: record.RecordWriter format')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    results = dict()
+    threat_search = None if args.threat_search == 'none' else args.threat_search
+    max_nodes = args.max_nodes if args.max_nodes > 0 else None
+    with (RecordWriter(args.output) if args.format == 'binary' else open(args.output, 'a')) as f:
+        records = self_play(args.games, args.workers, args.board_size, args.win_condition, args.mode,
+                            threat_search, max_nodes, args.time_limit, args.opening_moves, args.seed)
+        for num_games, record in enumerate(records, 1):
+            # Stream every record to disk as soon as its game ends
+            if args.format == 'binary':
+                config = player_config(args.mode, threat_search, max_nodes)
+                f.write(record['moves'], record['board_size'], record['win_condition'], record['winner'], (config, config), record['seed'])
+            else:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            results[record['winner']] = results.get(record['winner'], 0) + 1
+            elapsed = time.time() - start_time
+            print('games: %s/%s, games/s: %.3f, results: %s'%(num_games, args.games, num_games / elapsed, results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import time
+import numpy as np
+import batch
+from gomoku import Gomoku
+from agent import Iterative_Deepening_Alpha_Beta
+from mcts import Monte_Carlo_Tree_Search
+
+AGENTS = ('alpha_beta', 'mcts')
+
+# Engines of each worker process, set by init_engine():
+# agents: {(board_size, win_condition, agent, player_index, game): agent}, least recently used first
+engine = dict()
+
+def make_engine(board_size, win_condition, agent, player_index):
+    '''Agent of engine processes (quiet, with its tables allocated at creation)'''
+    env = Gomoku(board_size = board_size, win_condition = win_condition)
+    options = engine['options']
+    if agent == 'mcts':
+        return Monte_Carlo_Tree_Search(env, player_index, threat_search = options['threat_search'], verbose = False)
+    return Iterative_Deepening_Alpha_Beta(env, player_index, mode = options['mode'], threat_search = options['threat_search'],
+                                          transposition_size = options['transposition_size'], verbose = False)
+
+def init_engine(options):
+    '''Create the agents of the default board for both players, so the first requests do not pay for it'''
+    engine['options'] = options
+    engine['agents'] = collections.OrderedDict()
+    for player_index in (1, 2):
+        key = (options['board_size'], options['win_condition'], options['agent'], player_index)
+        engine['agents'][key + (None,)] = make_engine(*key)
+
+def search(request):
+    '''Search the position of a request in the engine process. Returns response (dict)'''
+    start_time = time.time()
+    board_size = request.get('board_size', engine['options']['board_size'])
+    win_condition = request.get('win_condition', engine['options']['win_condition'])
+    agent_name = request.get('agent', engine['options']['agent'])
+
+    # 1. Position: board rows of stone codes, or cells played from the empty board
+    if 'board' in request:
+        board = np.array(request['board'], dtype = int)
+    else:
+        env = Gomoku(board_size = board_size, win_condition = win_condition)
+        for cell in request.get('moves', list()):
+            env.push(cell)
+        board = env.board
+    assert board.shape == (board_size, board_size), 'board should be %s x %s'%(board_size, board_size)
+    # Player to move: given, or by the number of stones (black moves when both have the same number)
+    player_index = request.get('player', 1 if batch.next_stones(board)[0] == 1 else 2)
+
+    # 2. Search with the engine of the board, player and game (created on the first request),
+    # so its tables carry over between the moves of the game. Requests without game share one engine
+    game = request.get('game')
+    key = (board_size, win_condition, agent_name, player_index, str(game) if game is not None else None)
+    agents = engine['agents']
+    if key in agents:
+        agents.move_to_end(key)
+    else:
+        agents[key] = make_engine(*key[:4])
+        # Drop the least recently used engines
+        while len(agents) > engine['options']['max_engines']:
+            agents.popitem(last = False)
+    agent = agents[key]
+    time_limit = request.get('time_limit')
+    deadline = start_time + time_limit if time_limit is not None else None
+    max_nodes = request.get('max_nodes')
+    if deadline is None and max_nodes is None:
+        deadline = start_time + engine['options']['time_limit']
+    move = agent.search(board, deadline = deadline, max_nodes = max_nodes)
+    return {'move': int(move) if move is not None else None, 'player': player_index,
+            'nodes': agent.nodes, 'pv': [int(cell) for cell in agent.pv], 'search_seconds': time.time() - start_time}
+
+class MoveServer():
+    '''Serves moves over JSON lines on a local TCP socket.
+
+    Each line sent by a client is a request, answered by one JSON line in any order (matched by 'id'):
+        {'id': any, 'board': rows of stone codes, or 'moves': cells played from the empty board,
+         'player': player index to move (default: by the number of stones),
+         'time_limit': seconds, and/or 'max_nodes': node budget (default: time_limit of the server),
+         'game': any, requests of the same game go to the same engine process, and agent whose tables carry over
+            between its moves (each process keeps the agents of its max_engines most recent games and players),
+         'board_size', 'win_condition', 'agent': default to the server's}
+            -> {'id', 'move', 'player', 'nodes', 'pv', 'search_seconds', 'queue_seconds', 'latency_seconds'}
+        {'id': any, 'command': 'stats'} -> {'id', 'stats': stats()}
+    Errors are answered with {'id', 'error'}.
+
+    Requests wait in one queue per engine process (num_workers), and run in their process with warm agents.
+    Requests without 'game' go to the shortest queue.
+    '''
+    def __init__(self, host = '127.0.0.1', port = 8765, num_workers = 1, board_size = 15, win_condition = 5,
+                 agent = 'alpha_beta', mode = 'numeric', threat_search = 'vcf', time_limit = 5.0, transposition_size = 2**20,
+                 num_latencies = 10000, max_engines = 16):
+        assert agent in AGENTS, 'agent should be one of: %s'%(', '.join(AGENTS))
+        self.host = host
+        self.port = port
+        self.num_workers = num_workers
+        self.options = {'board_size': board_size, 'win_condition': win_condition, 'agent': agent, 'mode': mode,
+                        'threat_search': threat_search, 'time_limit': time_limit, 'transposition_size': transposition_size,
+                        'max_engines': max_engines}
+        self.server = None
+        self.executors = list()
+        self.queues = list()
+        self.dispatchers = list()
+        # Latencies (seconds from request to response) of the last num_latencies requests
+        self.latencies = collections.deque(maxlen = num_latencies)
+        self.num_requests = 0
+        self.num_errors = 0
+        self.running = 0
+        self.start_time = time.time()
+
+    async def start(self):
+        '''Start the engine processes (waiting for their agents to be created) and listen'''
+        loop = asyncio.get_running_loop()
+        for _ in range(self.num_workers):
+            # One process per executor, so each queue has its own engine
+            executor = concurrent.futures.ProcessPoolExecutor(1, initializer = init_engine, initargs = (self.options,))
+            await loop.run_in_executor(executor, time.sleep, 0)
+            self.executors.append(executor)
+            self.queues.append(asyncio.Queue())
+        self.dispatchers = [asyncio.create_task(self.dispatch(worker_index)) for worker_index in range(self.num_workers)]
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.start_time = time.time()
+
+    async def serve_forever(self, report_interval = None):
+        if report_interval is not None:
+            asyncio.create_task(self.report(report_interval))
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        for executor in self.executors:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+    async def report(self, interval):
+        '''Print stats() every interval seconds'''
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.stats()), flush = True)
+
+    def queue_depth(self):
+        '''Requests waiting for an engine'''
+        return sum(queue.qsize() for queue in self.queues)
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = {'p%s'%(q): float(np.percentile(latencies, q)) if len(latencies) > 0 else None for q in (50, 90, 99)}
+        elapsed = time.time() - self.start_time
+        return {'queue_depth': self.queue_depth(), 'running': self.running, 'workers': self.num_workers,
+                'requests': self.num_requests, 'errors': self.num_errors,
+                'requests_per_second': self.num_requests / elapsed if elapsed > 0 else None,
+                'latency_ms': percentiles}
+
+    def choose_queue(self, request):
+        game = request.get('game')
+        if game is not None:
+            return hash(str(game)) % self.num_workers
+        return min(range(self.num_workers), key = lambda worker_index: self.queues[worker_index].qsize())
+
+    async def dispatch(self, worker_index):
+        '''Run the requests of a queue one at a time in its engine process'''
+        loop = asyncio.get_running_loop()
+        queue = self.queues[worker_index]
+        while True:
+            request, received, future = await queue.get()
+            queue_seconds = time.time() - received
+            self.running += 1
+            try:
+                response = await loop.run_in_executor(self.executors[worker_index], search, request)
+                response['queue_seconds'] = queue_seconds
+                future.set_result(response)
+            except Exception as error:
+                future.set_exception(error)
+            finally:
+                self.running -= 1
+
+    async def handle_client(self, reader, writer):
+        '''Read requests of one connection, and answer each as soon as its search ends'''
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.handle_request(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def handle_request(self, line, writer, lock):
+        received = time.time()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if request.get('command') == 'stats':
+                response = {'stats': self.stats()}
+            else:
+                future = asyncio.get_running_loop().create_future()
+                await self.queues[self.choose_queue(request)].put((request, received, future))
+                response = await future
+                self.num_requests += 1
+                latency = time.time() - received
+                self.latencies.append(latency)
+                response['latency_seconds'] = latency
+        except Exception as error:
+            self.num_errors += 1
+            response = {'error': '%s: %s'%(type(error).__name__, error)}
+        response['id'] = request_id
+        async with lock:
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+async def serve(args):
+    threat_search = None if args.threat_search == 'none' else args.threat_search
+    server = MoveServer(args.host, args.port, args.workers, args.board_size, args.win_condition, args.agent, args.mode,
+                        threat_search, args.time_limit, max_engines = args.max_engines)
+    await server.start()
+    print('serving on %s:%s with %s engines'%(server.host, server.port, server.num_workers), flush = True)
+    try:
+        await server.serve_forever(args.report_interval)
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Serve moves of the agent over JSON lines on a local socket')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--workers', type = int, default = 1, help = 'engine processes')
+    parser.add_argument('--board-size', type = int, default = 15)
+    parser.add_argument('--win-condition', type = int, default = 5)
+    parser.add_argument('--agent', default = 'alpha_beta', choices = AGENTS)
+    parser.add_argument('--mode', default = 'numeric', choices = ['priority', 'numeric'])
+    parser.add_argument('--threat-search', default = 'vcf', choices = ['vcf', 'vct', 'none'])
+    parser.add_argument('--time-limit', type = float, default = 5.0, help = 'seconds per move of requests without budget')
+    parser.add_argument('--max-engines', type = int, default = 16, help = 'agents kept per engine process (one per game and player)')
+    parser.add_argument('--report-interval', type = float, default = None, help = 'seconds between stats printed')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
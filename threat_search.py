@@ -0,0 +1,183 @@
+import time
+
+class ThreatSpaceSearch():
+    '''Search for forced wins made of continuous threats, expanding only threat moves and their replies.
+
+    mode:
+        'vcf': Victory by Continuous Fours. Every attacker move makes a four,
+            so the defender's reply is forced, and a found sequence is a proof.
+        'vct': Victory by Continuous Threats. Attacker moves may also make open threes.
+            Defender replies to a three are limited to the cells on its lines that stop it,
+            and the defender's own fours, so a found sequence is a strong hint rather than a proof.
+    max_depth: maximum number of attacker moves in a sequence
+    max_nodes: maximum number of moves tried per solve()
+    time_limit: maximum seconds per solve(), or None
+    '''
+    def __init__(self, env, mode = 'vcf', max_depth = 10, max_nodes = 20000, time_limit = 1.0):
+        assert mode in ('vcf', 'vct'), 'mode should be one of: vcf, vct'
+        self.env = env
+        self.mode = mode
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.stop_event = None
+        # Hashes of positions (with remaining depth) already known to have no forced win
+        self.failed = set()
+
+    def solve(self, attacker_index, deadline = None, stop_event = None):
+        '''Return list of moves [attacker, defender, attacker, ...] ending with attacker's win
+        from the current position of env with attacker to move, or None.
+        deadline: time.time() value to give up at, if earlier than time_limit
+        stop_event: threading.Event to give up when set (e.g. by ponder.Ponderer.stop()), or None'''
+        self.nodes = 0
+        self.stop_event = stop_event
+        self.failed = set()
+        self.deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        if deadline is not None:
+            self.deadline = deadline if self.deadline is None else min(self.deadline, deadline)
+        defender_index = self.env.players.other(attacker_index)
+        return self.attack(attacker_index, defender_index, self.max_depth)
+
+    def attack(self, attacker_index, defender_index, depth):
+        # 1. Immediate win
+        wins = self.env.winning_moves(attacker_index)
+        if len(wins) > 0:
+            return [wins[0]]
+        if depth == 0 or self.out_of_budget():
+            return None
+        key = (self.env.hash, depth)
+        if key in self.failed:
+            return None
+
+        # 2. If defender threatens to win, attacker has to block with a four
+        defender_wins = self.env.winning_moves(defender_index)
+        if len(defender_wins) > 1:
+            self.failed.add(key)
+            return None
+
+        # 3. Try every threat move
+        for cell, threat in self.threat_moves(attacker_index, defender_wins):
+            if self.out_of_budget():
+                return None
+            self.nodes += 1
+            self.env.push(cell, attacker_index)
+            sequence = self.defend(attacker_index, defender_index, cell, threat, depth)
+            self.env.pop()
+            if sequence is not None:
+                return [cell] + sequence
+        self.failed.add(key)
+        return None
+
+    def out_of_budget(self):
+        return (self.nodes >= self.max_nodes or (self.deadline is not None and time.time() > self.deadline)
+                or (self.stop_event is not None and self.stop_event.is_set()))
+
+    def defend(self, attacker_index, defender_index, cell, threat, depth):
+        '''Defender to move after attacker's threat on cell. Return sequence if attacker wins against every reply'''
+        # 1. Defender wins first
+        if len(self.env.winning_moves(defender_index)) > 0:
+            return None
+
+        # 2. Replies to the threat
+        attacker_wins = self.env.winning_moves(attacker_index, self.env.line_neighborhood[cell])
+        # Four: the only reply is blocking it. Open four or double four cannot be blocked
+        if threat == 'four':
+            if len(attacker_wins) >= 2:
+                return [attacker_wins[0], attacker_wins[1]]
+            replies = attacker_wins
+        # Three: block the three, or counter with a four
+        else:
+            replies = set(self.defences(cell, attacker_index, defender_index))
+            replies.update(self.four_moves(defender_index))
+            replies = sorted(replies)
+
+        # 3. Attacker has to win against all replies
+        sequence = None
+        for reply in replies:
+            self.nodes += 1
+            self.env.push(reply, defender_index)
+            continuation = self.attack(attacker_index, defender_index, depth - 1)
+            self.env.pop()
+            if continuation is None:
+                return None
+            # Keep the line of the first (main) reply
+            if sequence is None:
+                sequence = [reply] + continuation
+        return sequence
+
+    def threat_moves(self, player_index, must_block = ()):
+        '''Return list of (cell, 'four' or 'three') moves of player_index.
+        If must_block is given, only moves on those cells are considered'''
+        if len(must_block) > 0:
+            candidates = must_block
+        else:
+            candidates = self.candidates(player_index)
+        threats = list()
+        threes = list()
+        for cell in candidates:
+            threat = self.threat_type(cell, player_index, threes = self.mode == 'vct')
+            if threat == 'four':
+                threats.append((cell, threat))
+            elif threat == 'three' and self.mode == 'vct':
+                threes.append((cell, threat))
+        # Fours first, they leave the defender one reply
+        return threats + threes
+
+    def four_moves(self, player_index):
+        '''Cells where player_index makes a four'''
+        return [cell for cell in self.candidates(player_index) if self.threat_type(cell, player_index, threes = False) == 'four']
+
+    def threat_type(self, cell, player_index, threes = True):
+        '''Classify the threat player_index makes by playing on cell: 'four', 'three' or None'''
+        env = self.env
+        stone = env.players.stone_code[player_index]
+        # Illegal moves place no stone
+        if env.is_illegal(cell, stone):
+            return None
+        # Stones are placed on the backend only: no hash, frontier or turn updates are needed here
+        env.backend.place(cell, stone)
+        threat = None
+        neighborhood = env.line_neighborhood[cell]
+        if len(env.winning_moves(player_index, neighborhood)) > 0:
+            threat = 'four'
+        # Three: a next move on the same lines would make an open (or double) four
+        elif threes and self.has_open_four_move(cell, player_index):
+            threat = 'three'
+        env.backend.remove(cell)
+        return threat
+
+    def has_open_four_move(self, cell, player_index):
+        '''Whether player_index can make an open (or double) four with one move on the lines through cell'''
+        env = self.env
+        stone = env.players.stone_code[player_index]
+        for next_cell in env.line_neighborhood[cell]:
+            if env.backend.get(next_cell) != 0 or env.is_illegal(next_cell, stone):
+                continue
+            env.backend.place(next_cell, stone)
+            open_four = len(env.winning_moves(player_index, env.line_neighborhood[next_cell])) >= 2
+            env.backend.remove(next_cell)
+            if open_four:
+                return True
+        return False
+
+    def defences(self, cell, attacker_index, defender_index):
+        '''Cells on the lines through cell where a defender stone stops attacker's three on cell'''
+        env = self.env
+        stone = env.players.stone_code[defender_index]
+        defences = list()
+        for reply in env.line_neighborhood[cell]:
+            if env.backend.get(reply) != 0:
+                continue
+            env.backend.place(reply, stone)
+            if not self.has_open_four_move(cell, attacker_index):
+                defences.append(reply)
+            env.backend.remove(reply)
+        return defences
+
+    def candidates(self, player_index):
+        '''Empty cells sharing a line with player's stones, within win_condition - 1 cells'''
+        cells = set()
+        for stone_cell in self.env.backend.stone_cells(self.env.players.stone_code[player_index]):
+            cells.update(self.env.line_neighborhood[stone_cell])
+        return sorted(cell for cell in cells if self.env.backend.get(cell) == 0)
@@ -0,0 +1,53 @@
+class TranspositionTable():
+    '''Fixed size table of search results, indexed by Zobrist hash
+
+    Each entry is a tuple (key, depth, bound, value, best_move, generation), where depth is the
+    number of plies searched below the position, and generation the search (move) which stored it.
+
+    replacement: policy when two positions map to the same slot
+        'depth': keep the entry searched deeper (ties go to the newer entry).
+            Entries of earlier generations are always replaced, so the table does not fill up
+            with deep entries of positions which can no longer be reached
+        'always': always keep the newer entry
+    '''
+    # Bound types
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size = 2**20, replacement = 'depth'):
+        assert replacement in ('depth', 'always'), 'replacement should be one of: depth, always'
+        self.size = size
+        self.replacement = replacement
+        self.clear()
+
+    def __len__(self):
+        return self.size - self.table.count(None)
+
+    def clear(self):
+        self.table = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_generation(self):
+        '''Keep the entries for the next search, as replaceable by it'''
+        self.generation += 1
+
+    def probe(self, key):
+        '''Return entry stored for key, or None'''
+        self.probes += 1
+        entry = self.table[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, value, best_move):
+        index = key % self.size
+        entry = self.table[index]
+        if entry is None or self.replacement == 'always' or entry[0] == key or depth >= entry[1] or entry[5] != self.generation:
+            self.table[index] = (key, depth, bound, value, best_move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes > 0 else 0.0